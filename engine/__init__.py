@@ -0,0 +1 @@
+# EruStudio Engine Package
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Bulk Rename engine for EruStudio
+UI-free planning of rename operations used by the Bulk Rename module.
+"""
+
+import os
+import time
+
+from engine.rename_graph import solve_tree_renames, is_case_insensitive, TEMP_PREFIX
+from engine.rename_journal import RenameJournal
+from engine.snapshot import Snapshotter
+
+# Folders created by the module's own backups are never renamed
+BACKUP_PREFIX = 'backup_'
+
+STATUS_READY = "✅ Ready"
+STATUS_EMPTY = "ℹ️ New name is empty"
+STATUS_NOT_IN_TEMPLATE = "ℹ️ Not in template"
+STATUS_NO_MATCH = "ℹ️ No rule match"
+STATUS_UNCHANGED = "ℹ️ Unchanged"
+STATUS_INVALID = "❌ Invalid name"
+
+
+def build_rename_mapping(current_names, new_names):
+    """Map current names to new names, both given as sequences of strings"""
+    return dict(zip((str(name) for name in current_names), (str(name) for name in new_names)))
+
+
+def plan_rename(filename, rename_mapping):
+    """Return the plan row for one item in the source folder"""
+    if filename not in rename_mapping:
+        return {'current': filename, 'new': "No change", 'status': STATUS_NOT_IN_TEMPLATE}
+
+    new_name_str = str(rename_mapping[filename]).strip()
+    # Blank cells come through pandas as '' or 'nan'
+    if new_name_str in ['', 'nan']:
+        return {'current': filename, 'new': "No change", 'status': STATUS_EMPTY}
+
+    # If the new name from the template doesn't have an extension, reuse the old one
+    _, old_ext = os.path.splitext(filename)
+    _, new_ext = os.path.splitext(new_name_str)
+    final_new_name = f"{new_name_str}{old_ext}" if not new_ext and old_ext else new_name_str
+    return {'current': filename, 'new': final_new_name, 'status': STATUS_READY}
+
+
+def plan_rule_rename(filename, rule, parent, stat_result=None):
+    """Return the plan row for one item using a RenameRule"""
+    new_name = rule.apply(filename, parent, stat_result)
+    if new_name is None:
+        return {'current': filename, 'new': "No change", 'status': STATUS_NO_MATCH}
+    new_name = new_name.strip()
+    if not new_name or new_name in ('.', '..') or '/' in new_name or os.sep in new_name:
+        return {'current': filename, 'new': new_name, 'status': STATUS_INVALID}
+    if new_name == filename:
+        return {'current': filename, 'new': "No change", 'status': STATUS_UNCHANGED}
+    return {'current': filename, 'new': new_name, 'status': STATUS_READY}
+
+
+def iter_tree_entries(source_folder, recursive=False, cancel_event=None):
+    """Yield (relative_parent, entry) for source_folder, walking subfolders too when recursive.
+
+    Entries are streamed one folder at a time with os.scandir and sorted by name
+    within each folder, so counters in rename rules are stable between runs.
+    """
+    stack = ['']
+    while stack:
+        rel_parent = stack.pop()
+        try:
+            with os.scandir(os.path.join(source_folder, rel_parent)) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            if not rel_parent:
+                raise
+            continue
+        subfolders = []
+        for entry in entries:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            # Like glob('*'), leave hidden entries alone
+            if entry.name.startswith(BACKUP_PREFIX) or entry.name.startswith('.'):
+                continue
+            yield rel_parent, entry
+            if recursive and entry.is_dir(follow_symlinks=False):
+                subfolders.append(os.path.join(rel_parent, entry.name))
+        stack.extend(reversed(subfolders))
+
+
+def iter_rename_plan(source_folder, rename_mapping, batch_size=500, cancel_event=None, rule=None, recursive=False):
+    """Yield plan rows for source_folder in batches of batch_size.
+
+    Names found in rename_mapping use the mapped name; everything else goes
+    through rule when one is given. With recursive, the whole tree is planned
+    and 'current'/'new' are paths relative to source_folder. Entries are read
+    lazily, so the first rows are available long before a large tree has been
+    listed. Stops early once cancel_event is set.
+    """
+    if rule is not None:
+        rule.reset()
+    root_name = os.path.basename(os.path.normpath(source_folder))
+    batch = []
+    for rel_parent, entry in iter_tree_entries(source_folder, recursive, cancel_event):
+        if entry.name in rename_mapping or rule is None:
+            row = plan_rename(entry.name, rename_mapping)
+        else:
+            stat_result = entry.stat(follow_symlinks=False) if rule.needs_stat else None
+            row = plan_rule_rename(entry.name, rule, os.path.basename(rel_parent) or root_name, stat_result)
+        if rel_parent:
+            row['current'] = os.path.join(rel_parent, row['current'])
+            if row['status'] == STATUS_READY:
+                row['new'] = os.path.join(rel_parent, row['new'])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_rename_mapping(template_path, current_col='Current Name', new_col='New Name'):
+    """Read a rename template into a mapping of current names to new names"""
+    import pandas as pd
+    template_data = pd.read_excel(template_path)
+    for col in (current_col, new_col):
+        if col not in template_data.columns:
+            raise ValueError(f"Template has no '{col}' column.")
+    return build_rename_mapping(template_data[current_col].astype(str), template_data[new_col].astype(str))
+
+
+def find_conflicts(source_folder, items):
+    """Order the ready renames without changing any item. Returns (steps, {current name: conflict status})."""
+    ready_items = [item for item in items if item['status'] == STATUS_READY]
+    return solve_tree_renames(source_folder, [(item['current'], item['new']) for item in ready_items],
+                              is_case_insensitive(source_folder))
+
+
+def apply_conflicts(items, conflicts):
+    """Flag the ready items whose current name is in conflicts (see find_conflicts)"""
+    for item in items:
+        if item['status'] == STATUS_READY and item['current'] in conflicts:
+            item['status'] = conflicts[item['current']]
+
+
+def check_conflicts(source_folder, items):
+    """Order the ready renames and flag the ones that would collide. Returns the rename steps to apply."""
+    steps, conflicts = find_conflicts(source_folder, items)
+    apply_conflicts(items, conflicts)
+    return steps
+
+
+def execute_renames(source_folder, items, backup=False, on_progress=None):
+    """Apply the ready plan rows through a rename journal.
+
+    Rows are re-checked against the folder as it is now, so swaps, chains and
+    case-only renames are ordered and collisions are skipped. With backup, the
+    affected items are snapshotted into backup_<timestamp> first.
+    on_progress(step) is called after each journal step.
+
+    Returns {'renamed', 'errors', 'backup', 'journal'}; 'backup' is a summary line or None.
+    """
+    ready_items = [item for item in items if item['status'] == STATUS_READY]
+    steps = check_conflicts(source_folder, ready_items)
+    conflicted = [item for item in ready_items if item['status'] != STATUS_READY]
+    ready_items = [item for item in ready_items if item['status'] == STATUS_READY]
+
+    backup_summary = None
+    if backup:
+        backup_folder = os.path.join(source_folder, f"{BACKUP_PREFIX}{time.strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(backup_folder, exist_ok=True)
+        snapshotter = Snapshotter()
+        snapshotted = set()
+        for item in sorted(ready_items, key=lambda item: item['current']):
+            # A renamed folder's backup already holds everything below it
+            parent = os.path.dirname(item['current'])
+            while parent and parent not in snapshotted:
+                parent = os.path.dirname(parent)
+            if parent:
+                continue
+            snapshotted.add(item['current'])
+            # Keep the folder layout so items from different subfolders cannot collide
+            item_backup_folder = os.path.join(backup_folder, os.path.dirname(item['current']))
+            os.makedirs(item_backup_folder, exist_ok=True)
+            snapshotter.snapshot(os.path.join(source_folder, item['current']), item_backup_folder)
+        backup_summary = f"Backup: {snapshotter.describe()}."
+
+    errors = [f"{item['current']} -> {item['new']}: {item['status']}" for item in conflicted]
+    renamed_count = 0
+    journal = None
+    if steps:
+        # The plan is synced to the journal before the first file is touched
+        journal = RenameJournal.create(source_folder, steps)
+        _, apply_errors = journal.apply(on_progress)
+        errors += apply_errors
+        # Hops through temporary names are not counted as renames
+        renamed_count = sum(1 for op in journal.operations if op['done'] and not os.path.basename(op['dst']).startswith(TEMP_PREFIX))
+    return {'renamed': renamed_count, 'errors': errors, 'backup': backup_summary, 'journal': journal}
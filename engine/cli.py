@@ -0,0 +1,213 @@
+"""
+EruStudio command line interface
+Runs the four EruStudio operations without the desktop UI and reports progress as JSON lines.
+
+    erustudio rename SOURCE [--template FILE] [--pattern P --name-template T] [--recursive] [--dry-run]
+    erustudio zip SOURCE OUTPUT [--template FILE] [--workers N] [--policy NAME] [--update] [--dry-run]
+    erustudio mkdirs TEMPLATE OUTPUT [--name-column C] [--parent-column C[,C...]] [--readme] [--workers N] [--starter-files DIR] [--dry-run]
+    erustudio sync WORKBOOK OUTPUT [--sheets A,B] [--header-row N] [--compression NAME] [--no-cache]
+
+Every line written to stdout is one JSON object with an "event" key: "plan",
+"item", "progress", "summary", "done" or "error". The exit code is 0 on success, 1 when
+some items failed and 2 for invalid arguments or a failed run.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+EXIT_OK = 0
+EXIT_ITEM_ERRORS = 1
+EXIT_FAILED = 2
+
+
+def emit(event, **fields):
+    """Write one JSON-lines record to stdout"""
+    sys.stdout.write(json.dumps({'event': event, **fields}, ensure_ascii=False, default=str) + '\n')
+    sys.stdout.flush()
+
+
+def run_rename(args):
+    from engine.bulk_rename import iter_rename_plan, execute_renames, load_rename_mapping, check_conflicts, STATUS_READY
+    from engine.rename_rules import RenameRule
+
+    if not args.template and not args.pattern:
+        raise ValueError("Give a --template, a --pattern, or both.")
+    rename_mapping = load_rename_mapping(args.template, args.current_column, args.new_column) if args.template else {}
+    rule = RenameRule(args.pattern, args.mode, args.name_template, args.case) if args.pattern else None
+
+    items = []
+    for batch in iter_rename_plan(args.source, rename_mapping, rule=rule, recursive=args.recursive):
+        items.extend(batch)
+    check_conflicts(args.source, items)
+    for item in items:
+        emit('item', current=item['current'], new=item['new'], status=item['status'])
+    ready_count = sum(1 for item in items if item['status'] == STATUS_READY)
+    emit('plan', items=len(items), ready=ready_count)
+    if args.dry_run or not ready_count:
+        emit('summary', renamed=0, errors=[], dry_run=args.dry_run)
+        return EXIT_OK
+
+    result = execute_renames(args.source, items, backup=args.backup,
+                             on_progress=lambda op: emit('progress', src=op['src'], dst=op['dst'], done=op['done']))
+    emit('summary', renamed=result['renamed'], errors=result['errors'], backup=result['backup'],
+         journal=result['journal'].path if result['journal'] else None)
+    return EXIT_ITEM_ERRORS if result['errors'] else EXIT_OK
+
+
+def run_zip(args):
+    from engine.multi_zip import plan_zip_tasks, run_zip_tasks, STATUS_READY, STATUS_EXISTS
+
+    tasks = plan_zip_tasks(args.source, args.output, args.template, not args.whole_folder)
+    statuses = (STATUS_READY, STATUS_EXISTS) if args.update else (STATUS_READY,)
+    runnable = [task for task in tasks if task['status'] in statuses]
+    for task in tasks:
+        emit('item', name=task['name'], path=task['path'], zip_path=task['zip_path'],
+             size=task['size'], files=task['files'], status=task['status'])
+    emit('plan', folders=len(tasks), runnable=len(runnable))
+    if args.dry_run or not runnable:
+        emit('summary', zipped=0, errors=[], dry_run=args.dry_run)
+        return EXIT_OK
+
+    def on_done(task, result, error):
+        if error is not None:
+            emit('progress', name=task['name'], error=str(error))
+        else:
+            emit('progress', name=task['name'], zip_path=task['zip_path'], **result)
+
+    processed_count, errors = run_zip_tasks(runnable, include_root_dir=args.include_root_dir,
+                                            max_workers=args.workers, use_processes=not args.threads,
+                                            split_members=args.split, policy=args.policy,
+                                            incremental=args.update, on_done=on_done)
+    emit('summary', zipped=processed_count, errors=errors)
+    return EXIT_ITEM_ERRORS if errors else EXIT_OK
+
+
+def run_mkdirs(args):
+    from engine.folder_creator import load_folder_template, plan_folders, create_folders, STATUS_READY, STATUS_EXISTS
+    from engine.scaffold import load_scaffold
+
+    template_data = load_folder_template(args.template)
+    if args.name_column not in template_data.columns:
+        raise ValueError(f"Template has no '{args.name_column}' column.")
+    parent_columns = [column.strip() for column in args.parent_column.split(',')]
+    missing = [column for column in parent_columns if column not in template_data.columns]
+    if missing and args.parent_column != 'Parent Folder':
+        raise ValueError(f"Template has no '{missing[0]}' column.")
+    items = plan_folders(template_data, args.output, args.name_column, [c for c in parent_columns if c not in missing])
+    scaffold = load_scaffold(args.starter_files, template_data, args.hard_links) if args.starter_files else None
+    for item in items:
+        emit('item', name=item['name'], parent=item['parent'], path=item['full_path'], status=item['status'])
+    ready_count = sum(1 for item in items if item['status'] == STATUS_READY)
+    existing_count = sum(1 for item in items if item['status'] == STATUS_EXISTS)
+    # The dry-run diff: create the ready ones, skip the existing ones, report the ones blocked by files
+    emit('plan', folders=len(items), ready=ready_count, existing=existing_count,
+         conflicts=len(items) - ready_count - existing_count)
+    if args.dry_run or not ready_count:
+        emit('summary', created=0, errors=[], dry_run=args.dry_run)
+        return EXIT_OK
+
+    created_count, errors = create_folders(items, args.readme,
+                                           on_progress=lambda item: emit('progress', path=item['full_path'], status=item['status']),
+                                           max_workers=args.workers, scaffold=scaffold)
+    emit('summary', created=created_count, errors=errors, starter_files=scaffold.describe() if scaffold else None)
+    return EXIT_ITEM_ERRORS if errors else EXIT_OK
+
+
+def run_sync(args):
+    from engine.sheet_cache import default_cache
+    from engine.worksheet_sync import list_worksheets, open_session, stream_sync
+
+    session = open_session(args.workbook)
+    try:
+        available = list_worksheets(args.workbook, session)
+        sheets = [name.strip() for name in args.sheets.split(',')] if args.sheets else available
+        missing = [name for name in sheets if name not in available]
+        if missing:
+            raise ValueError(f"Worksheet(s) not found: {', '.join(missing)}")
+        emit('plan', sheets=sheets)
+
+        result = stream_sync(args.workbook, sheets, args.output, args.header_row,
+                             on_progress=lambda name, rows: emit('progress', sheet=name, rows=rows),
+                             session=session, max_workers=args.workers, compression=args.compression,
+                             cache=None if args.no_cache else default_cache())
+    finally:
+        if session is not None:
+            session.close()
+    emit('summary', rows=result['rows'], columns=result['columns'], sheets=result['sheets'], output=args.output)
+    return EXIT_OK
+
+
+def build_parser():
+    from engine.compression_policy import POLICIES, DEFAULT_POLICY
+    from engine.rename_rules import MODES, MODE_GLOB, CASES, CASE_KEEP
+
+    parser = argparse.ArgumentParser(prog='erustudio', description="EruStudio batch operations without the desktop UI.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rename = subparsers.add_parser('rename', help="Rename files from a template and/or a pattern rule")
+    rename.add_argument('source', help="Folder whose entries are renamed")
+    rename.add_argument('--template', help="Excel template with current and new names")
+    rename.add_argument('--current-column', default='Current Name')
+    rename.add_argument('--new-column', default='New Name')
+    rename.add_argument('--pattern', help="Rule pattern for names not in the template")
+    rename.add_argument('--mode', choices=MODES, default=MODE_GLOB)
+    rename.add_argument('--name-template', default='{name}{ext}', help="New name template, e.g. '{parent}_{n:03d}{ext}'")
+    rename.add_argument('--case', choices=CASES, default=CASE_KEEP)
+    rename.add_argument('--recursive', action='store_true', help="Include subfolders")
+    rename.add_argument('--backup', action='store_true', help="Snapshot affected items into backup_<timestamp> first")
+    rename.add_argument('--dry-run', action='store_true', help="Only print the plan")
+    rename.set_defaults(handler=run_rename)
+
+    zip_parser = subparsers.add_parser('zip', help="Zip folders into separate archives")
+    zip_parser.add_argument('source', help="Folder containing the folders to zip")
+    zip_parser.add_argument('output', help="Folder the archives are written to")
+    zip_parser.add_argument('--template', help="Excel template with a 'Folder Name' column")
+    zip_parser.add_argument('--whole-folder', action='store_true', help="Zip SOURCE itself instead of its subfolders")
+    zip_parser.add_argument('--include-root-dir', action='store_true')
+    zip_parser.add_argument('--workers', type=int, default=None)
+    zip_parser.add_argument('--threads', action='store_true', help="Use threads instead of worker processes")
+    zip_parser.add_argument('--split', action='store_true', help="Split large archives across all workers")
+    zip_parser.add_argument('--policy', choices=list(POLICIES), default=DEFAULT_POLICY)
+    zip_parser.add_argument('--update', action='store_true', help="Update existing archives incrementally")
+    zip_parser.add_argument('--dry-run', action='store_true', help="Only print the plan")
+    zip_parser.set_defaults(handler=run_zip)
+
+    mkdirs = subparsers.add_parser('mkdirs', help="Create folders from a template")
+    mkdirs.add_argument('template', help="Excel template describing the folders")
+    mkdirs.add_argument('output', help="Folder the structure is created in")
+    mkdirs.add_argument('--name-column', default='Folder Name')
+    mkdirs.add_argument('--parent-column', default='Parent Folder',
+                        help="Parent column, or comma-separated columns for nested levels, outermost first")
+    mkdirs.add_argument('--readme', action='store_true', help="Write a README.txt into each new folder")
+    mkdirs.add_argument('--workers', type=int, default=None, help="Folders created at the same time per drive or share (default: 16)")
+    mkdirs.add_argument('--starter-files', help="Folder of files to put in each new folder; '*.tmpl' files are filled from the row")
+    mkdirs.add_argument('--hard-links', action='store_true', help="Hard-link static starter files when they cannot be reflinked")
+    mkdirs.add_argument('--dry-run', action='store_true', help="Only print the plan")
+    mkdirs.set_defaults(handler=run_mkdirs)
+
+    sync = subparsers.add_parser('sync', help="Merge worksheets of a workbook into one sheet")
+    sync.add_argument('workbook', help="Excel workbook to read")
+    sync.add_argument('output', help="File to write; the format follows the extension (.xlsx, .csv, .csv.gz, .parquet, .feather)")
+    sync.add_argument('--sheets', help="Comma-separated worksheet names (default: all)")
+    sync.add_argument('--header-row', type=int, default=1)
+    sync.add_argument('--compression', help="Parquet: snappy, zstd, gzip, lz4, brotli or none; Feather: lz4, zstd or none")
+    sync.add_argument('--workers', type=int, default=None,
+                      help="Sheets parsed in parallel (1 with --no-cache streams row by row with the least memory)")
+    sync.add_argument('--no-cache', action='store_true', help="Neither read nor fill the parsed-sheet cache")
+    sync.set_defaults(handler=run_sync)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    started = time.perf_counter()
+    try:
+        code = args.handler(args)
+    except Exception as e:
+        emit('error', message=str(e), type=type(e).__name__)
+        return EXIT_FAILED
+    emit('done', command=args.command, seconds=round(time.perf_counter() - started, 3), exit_code=code)
+    return code
@@ -0,0 +1,90 @@
+"""
+Compression policies for EruStudio
+Decide per archive member whether to store it or which codec and level to use.
+"""
+
+import math
+import os
+import zipfile
+from collections import Counter
+
+# Formats that are already compressed; deflating them again only burns CPU
+ALREADY_COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.avif', '.jp2',
+    '.mp4', '.m4v', '.mov', '.mkv', '.avi', '.wmv', '.webm', '.mpg', '.mpeg',
+    '.mp3', '.aac', '.m4a', '.ogg', '.opus', '.flac', '.wma',
+    '.zip', '.7z', '.rar', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.lz4', '.cab',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp', '.epub', '.jar', '.apk',
+}
+
+# Bytes read from the start of a file to estimate how compressible it is
+SAMPLE_SIZE = 64 * 1024
+
+# Samples smaller than this are not worth measuring
+MIN_SAMPLE_SIZE = 4 * 1024
+
+# Shannon entropy (bits per byte) above which a sample is treated as incompressible
+ENTROPY_THRESHOLD = 7.5
+
+
+def sample_entropy(file_path, sample_size=SAMPLE_SIZE):
+    """Return the entropy in bits per byte of the first block of a file, or None if it is too small to judge"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    if len(sample) < MIN_SAMPLE_SIZE:
+        return None
+    total = len(sample)
+    return -sum(count / total * math.log2(count / total) for count in Counter(sample).values())
+
+
+class CompressionPolicy:
+    """Picks (compress_type, compresslevel) for each file written to an archive.
+
+    Extension rules win first; otherwise, when entropy_threshold is set, files whose
+    first block looks random are stored, and everything else gets the default codec.
+    Instances only hold plain values so they can be sent to pool workers.
+    """
+
+    def __init__(self, compress_type=zipfile.ZIP_DEFLATED, level=None, rules=None, entropy_threshold=None):
+        self.compress_type = compress_type
+        self.level = None if compress_type == zipfile.ZIP_STORED else level
+        self.rules = dict(rules or {})
+        self.entropy_threshold = entropy_threshold
+
+    def choose(self, file_path):
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in self.rules:
+            return self.rules[ext]
+        if self.entropy_threshold is not None and self.compress_type != zipfile.ZIP_STORED:
+            entropy = sample_entropy(file_path)
+            if entropy is not None and entropy >= self.entropy_threshold:
+                return zipfile.ZIP_STORED, None
+        return self.compress_type, self.level
+
+
+POLICIES = {
+    'Smart': CompressionPolicy(
+        zipfile.ZIP_DEFLATED, 6,
+        rules={ext: (zipfile.ZIP_STORED, None) for ext in ALREADY_COMPRESSED_EXTENSIONS},
+        entropy_threshold=ENTROPY_THRESHOLD,
+    ),
+    'Deflate (fast)': CompressionPolicy(zipfile.ZIP_DEFLATED, 1),
+    'Deflate': CompressionPolicy(zipfile.ZIP_DEFLATED, 6),
+    'Deflate (max)': CompressionPolicy(zipfile.ZIP_DEFLATED, 9),
+    'BZIP2': CompressionPolicy(zipfile.ZIP_BZIP2, 9),
+    'LZMA': CompressionPolicy(zipfile.ZIP_LZMA),
+    'Store only': CompressionPolicy(zipfile.ZIP_STORED),
+}
+
+DEFAULT_POLICY = 'Smart'
+
+
+def get_policy(policy=None):
+    """Accept a policy name, a CompressionPolicy or None (the default policy)"""
+    if policy is None:
+        policy = DEFAULT_POLICY
+    if isinstance(policy, CompressionPolicy):
+        return policy
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown compression policy '{policy}'. Choose from: {', '.join(POLICIES)}")
+    return POLICIES[policy]
@@ -0,0 +1,272 @@
+"""
+Chunk exporters for EruStudio
+Streaming writers that append DataFrame chunks to xlsx, CSV, Parquet or Feather files with constant memory.
+"""
+
+import os
+
+# Rows per Excel sheet, header included; longer exports continue on <sheet>_2, <sheet>_3, ...
+EXCEL_MAX_ROWS = 1048576
+
+PARQUET_COMPRESSIONS = ('snappy', 'zstd', 'gzip', 'lz4', 'brotli', 'none')
+FEATHER_COMPRESSIONS = ('lz4', 'zstd', 'none')
+
+
+def _require_pyarrow(format_name):
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ImportError(f"{format_name} export needs pyarrow. Install it with: pip install pyarrow")
+
+
+def _check_compression(compression, choices, format_name):
+    if compression not in choices:
+        raise ValueError(f"Unknown {format_name} compression '{compression}'. Choose from: {', '.join(choices)}")
+    return None if compression == 'none' else compression
+
+
+class ChunkExporter:
+    """Base class: write(chunk) for each DataFrame chunk, then close(), or abort() to remove the partial file.
+
+    Every chunk must have the columns given to the constructor, in that order.
+    sheet_name is only used by formats that have sheets.
+    """
+
+    def __init__(self, path, columns, compression=None, sheet_name='Data'):
+        self.path = path
+        self.columns = list(columns)
+        self.compression = compression
+        self.sheet_name = sheet_name
+        self.rows = 0
+        self.sheets = 1
+
+    def write(self, chunk):
+        self._write(chunk)
+        self.rows += len(chunk)
+
+    def _write(self, chunk):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Close without finishing and delete whatever was written"""
+        try:
+            self._release()
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _release(self):
+        pass
+
+
+class XlsxExporter(ChunkExporter):
+    """Write-only xlsx workbook; each sheet starts with the header row and holds at most EXCEL_MAX_ROWS rows"""
+
+    def __init__(self, path, columns, compression=None, sheet_name='Data', max_rows=EXCEL_MAX_ROWS):
+        from openpyxl import Workbook
+        super().__init__(path, columns, compression, sheet_name)
+        self.max_rows = max_rows
+        self.workbook = Workbook(write_only=True)
+        self.sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheets += 1
+        name = self.sheet_name if self.sheets == 1 else f"{self.sheet_name}_{self.sheets}"
+        self.ws = self.workbook.create_sheet(name)
+        self.ws.append(self.columns)
+        self.sheet_rows = 1
+
+    def _write(self, chunk):
+        # Missing values become empty cells; Excel rejects NaN
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if self.sheet_rows >= self.max_rows:
+                self._new_sheet()
+            self.ws.append(row)
+            self.sheet_rows += 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class CsvExporter(ChunkExporter):
+    """UTF-8 CSV with one header line; compression 'gzip' writes a gzip-compressed file"""
+
+    def __init__(self, path, columns, compression=None, sheet_name='Data'):
+        super().__init__(path, columns, _check_compression(compression or 'none', ('none', 'gzip'), 'CSV'), sheet_name)
+        if self.compression == 'gzip':
+            import gzip
+            self.file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        else:
+            self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.header_written = False
+
+    def _write(self, chunk):
+        chunk.to_csv(self.file, header=not self.header_written, index=False)
+        self.header_written = True
+
+    def close(self):
+        if not self.header_written:
+            import pandas as pd
+            pd.DataFrame(columns=self.columns).to_csv(self.file, index=False)
+        self.file.close()
+
+    def _release(self):
+        self.file.close()
+
+
+def _is_text(pa, field_type):
+    return pa.types.is_string(field_type) or pa.types.is_large_string(field_type)
+
+
+def _as_text(column):
+    """Column values as strings, keeping missing values missing"""
+    return column.map(lambda value: value if value is None or value != value else str(value))
+
+
+class _ArrowExporter(ChunkExporter):
+    """Shared schema handling for the Arrow-based formats.
+
+    Column types are fixed by the dtypes of the first chunk; object columns
+    that are empty or mix types, as Excel data often does, and categorical
+    columns are stored as strings. Later chunks are converted to those types
+    without losing values. A column that turns from numbers into text is
+    rejected with a ValueError.
+    """
+
+    format_name = 'Arrow'
+
+    def __init__(self, path, columns, compression=None, sheet_name='Data'):
+        super().__init__(path, columns, compression, sheet_name)
+        self.pa = _require_pyarrow(self.format_name)
+        self.schema = None
+        self.writer = None
+
+    def _infer_schema(self, chunk):
+        import pandas as pd
+        pa = self.pa
+        fields = []
+        for name in chunk.columns:
+            column = chunk[name]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                # Each chunk has its own dictionary, which Feather files cannot hold
+                field_type = pa.string()
+            elif column.dtype == object and (column.isna().all() or pd.api.types.infer_dtype(column, skipna=True).startswith('mixed')):
+                field_type = pa.string()
+            else:
+                field_type = pa.array(column, from_pandas=True).type
+            # Arrow column names must be strings
+            fields.append(pa.field(str(name), field_type))
+        return pa.schema(fields)
+
+    def _to_table(self, chunk):
+        import pandas as pd
+        pa = self.pa
+        if self.schema is None:
+            self.schema = self._infer_schema(chunk)
+        arrays = []
+        for field, name in zip(self.schema, chunk.columns):
+            column = chunk[name]
+            if column.isna().all():
+                arrays.append(pa.nulls(len(column), field.type))
+                continue
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype(object)
+            if _is_text(pa, field.type) and column.dtype == object:
+                column = _as_text(column)
+            try:
+                arrays.append(pa.array(column, type=field.type, from_pandas=True))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                if not _is_text(pa, field.type):
+                    raise ValueError(f"Column '{name}' holds {field.type} values in earlier rows but not in "
+                                     f"{chunk.iat[0, 0]}; export it to xlsx or CSV instead.")
+                arrays.append(pa.array(_as_text(column), type=field.type, from_pandas=True))
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def _write(self, chunk):
+        table = self._to_table(chunk)
+        if self.writer is None:
+            self.writer = self._open_writer()
+        self.writer.write_table(table)
+
+    def _open_writer(self):
+        raise NotImplementedError
+
+    def close(self):
+        if self.writer is None:
+            import pandas as pd
+            self._write(pd.DataFrame(columns=self.columns))
+        self.writer.close()
+
+    def _release(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ParquetExporter(_ArrowExporter):
+    """Parquet file written one row group per chunk"""
+
+    format_name = 'Parquet'
+
+    def __init__(self, path, columns, compression=None, sheet_name='Data'):
+        super().__init__(path, columns, _check_compression(compression or 'snappy', PARQUET_COMPRESSIONS, 'Parquet'), sheet_name)
+
+    def _open_writer(self):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, self.schema, compression=self.compression or 'none')
+
+
+class FeatherExporter(_ArrowExporter):
+    """Feather v2 (Arrow IPC file) written one record batch per chunk"""
+
+    format_name = 'Feather'
+
+    def __init__(self, path, columns, compression=None, sheet_name='Data'):
+        super().__init__(path, columns, _check_compression(compression or 'lz4', FEATHER_COMPRESSIONS, 'Feather'), sheet_name)
+
+    def _open_writer(self):
+        options = self.pa.ipc.IpcWriteOptions(compression=self.compression)
+        return self.pa.ipc.new_file(self.path, self.schema, options=options)
+
+
+# File extension -> exporter; the save dialogs and the CLI pick the format from the output name
+EXPORTERS = {
+    '.xlsx': XlsxExporter,
+    '.csv': CsvExporter,
+    '.csv.gz': CsvExporter,
+    '.parquet': ParquetExporter,
+    '.feather': FeatherExporter,
+    '.arrow': FeatherExporter,
+}
+
+EXPORT_FILETYPES = (
+    ("Excel files", "*.xlsx"),
+    ("CSV files", "*.csv"),
+    ("Parquet files", "*.parquet"),
+    ("Feather files", "*.feather *.arrow"),
+)
+
+
+def export_filetypes():
+    """Save-dialog file types for the formats that can be written with the installed packages"""
+    from engine.workbook_session import arrow_available
+    if arrow_available():
+        return list(EXPORT_FILETYPES)
+    return [filetype for filetype in EXPORT_FILETYPES if filetype[0] not in ("Parquet files", "Feather files")]
+
+
+def open_exporter(path, columns, compression=None, sheet_name='Data'):
+    """Create the exporter for path's extension; '.csv.gz' is gzip-compressed CSV"""
+    lower_path = path.lower()
+    extension = '.csv.gz' if lower_path.endswith('.csv.gz') else os.path.splitext(lower_path)[1]
+    exporter_class = EXPORTERS.get(extension)
+    if exporter_class is None:
+        raise ValueError(f"Unsupported export format '{extension}'. Use one of: {', '.join(EXPORTERS)}")
+    if extension == '.csv.gz':
+        compression = 'gzip'
+    return exporter_class(path, columns, compression, sheet_name)
@@ -0,0 +1,315 @@
+"""
+Folder Creator engine for EruStudio
+Plan and create folder structures described by an Excel template.
+"""
+
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePath
+
+from engine.folder_snapshot import FolderSnapshot, PATH_DIR, PATH_FILE, PATH_BLOCKED
+
+STATUS_READY = "✅ Ready"
+STATUS_EXISTS = "⚠️ Exists"
+STATUS_CREATED = "✅ Created"
+# The folder was made but its README or starter files were not; it is not attempted again
+STATUS_INCOMPLETE = "⚠️ Files failed"
+STATUS_ERROR = "❌ Error"
+# A file is in the way: the path itself, or one of its parents, is a file
+STATUS_CONFLICT = "❌ Conflict"
+
+README_NAME = "README.txt"
+
+# Folders of one drive or share created at the same time; local disks gain little, network shares a lot
+DEFAULT_FOLDER_WORKERS = 16
+# Most sibling folders one pool task creates in a row
+FOLDER_BATCH_SIZE = 64
+
+
+def load_folder_template(template_path):
+    """Read a folder template; empty cells stay empty strings"""
+    import pandas as pd
+    return pd.read_excel(template_path, na_filter=False)
+
+
+def _template_column(template_data, column):
+    """A template column as stripped strings; missing columns and empty cells become ''"""
+    if not column or column not in template_data.columns:
+        import pandas as pd
+        return pd.Series('', index=template_data.index)
+    return template_data[column].fillna('').astype(str).str.strip()
+
+
+def _parent_paths(template_data, parent_cols):
+    """Join the parent columns, outermost first, into one relative path per row; empty levels are skipped"""
+    if isinstance(parent_cols, str):
+        parent_cols = [parent_cols]
+    separators = '/\\'
+    parents = None
+    for column in parent_cols or ():
+        level = _template_column(template_data, column).str.strip(separators)
+        if parents is None:
+            parents = level
+        else:
+            parents = parents.where(level == '', parents.where(parents == '', parents + os.sep) + level)
+    return parents if parents is not None else _template_column(template_data, None)
+
+
+def plan_folders(template_data, output_folder, folder_col, parent_col=None, snapshot=None):
+    """Return one plan item per distinct folder: {'name', 'parent', 'full_path', 'status', 'row'}.
+
+    parent_col is one column or a list of columns, outermost level first, and
+    any of them may hold a whole path such as 'Clients/Acme/2024', so a
+    template can describe a hierarchy of any depth. Rows with an empty name
+    are skipped and repeated paths are planned once. 'row' is the position of
+    the item's template row.
+
+    Each folder is Ready, Exists, or Conflict when a file is in its way,
+    diffed against snapshot (an engine.folder_snapshot.FolderSnapshot): one
+    listing of each distinct parent folder instead of one stat per row. Keep
+    the same snapshot between plans of one output folder and only the parent
+    folders that changed are listed again.
+    """
+    import pandas as pd
+    names = _template_column(template_data, folder_col)
+    parents = _parent_paths(template_data, parent_col)
+    rows = pd.Series(range(len(template_data)), index=template_data.index)
+    keep = names != ''
+    names, parents, rows = names[keep], parents[keep], rows[keep]
+
+    relative = parents.where(parents == '', parents + os.sep) + names
+    if os.altsep:
+        relative = relative.str.replace(os.altsep, os.sep, regex=False)
+    # normpath turns the '/' of Windows folder pickers into '\\', so every path compares the same way
+    full_paths = os.path.join(os.path.normpath(output_folder), '') + relative
+    # Case-insensitive file systems (Windows) compare paths lower-cased, as os.path.normcase does
+    keys = full_paths.str.lower() if os.path.normcase('A') != 'A' else full_paths
+    unique = ~keys.duplicated()
+    names, parents, rows, full_paths, keys = names[unique], parents[unique], rows[unique], full_paths[unique], keys[unique]
+
+    folders = full_paths.str.rpartition(os.sep)[0]
+    unique_folders = folders.unique()
+    snapshot = snapshot if snapshot is not None else FolderSnapshot()
+    snapshot.refresh(unique_folders)
+    dir_keys, file_keys, blocked = snapshot.known_paths(unique_folders)
+    # Set lookups on plain lists; Series.isin walks the whole set again for every call on Arrow strings
+    statuses = [STATUS_CONFLICT if key in file_keys or (blocked and key.rpartition(os.sep)[0] in blocked)
+                else STATUS_EXISTS if key in dir_keys else STATUS_READY for key in keys.tolist()]
+    return [{'name': name, 'parent': parent, 'full_path': full_path, 'status': status, 'row': row}
+            for name, parent, full_path, status, row in zip(names.tolist(), parents.tolist(), full_paths.tolist(),
+                                                            statuses, rows.tolist())]
+
+
+def diff_folders(items, snapshot):
+    """Set the status of plan items from snapshot alone, without touching the disk.
+
+    After create_folders has recorded what it made in the snapshot, this
+    turns Created into Exists and leaves failed folders Ready, so applying the
+    plan again only attempts what is still missing. Folders whose files failed
+    keep that status, so the failure stays visible.
+    """
+    statuses = {PATH_DIR: STATUS_EXISTS, PATH_FILE: STATUS_CONFLICT, PATH_BLOCKED: STATUS_CONFLICT}
+    for item in items:
+        if item['status'] == STATUS_INCOMPLETE:
+            continue
+        state = snapshot.state_of(item['full_path'])
+        if state is not None:
+            item['status'] = statuses.get(state, STATUS_READY)
+
+
+def build_folder_tree(paths):
+    """Prefix tree of paths as nested dicts {component: subtree}; the top keys are roots such as '/' or 'C:\\'.
+
+    Every folder appears once however many paths share it.
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        for part in PurePath(path).parts:
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _make_folder(path, exists, child_count, fill_folder):
+    """Make path unless it exists, then fill it.
+
+    exists is True or False when the parent's listing already told, None when
+    path has to be checked. Returns (made, existing_children, fill_error);
+    existing_children is None when the children are better checked one by one.
+    """
+    if exists is None:
+        exists = os.path.isdir(path)
+    if not exists:
+        os.mkdir(path)
+        existing = set()
+    elif child_count > 1:
+        with os.scandir(path) as entries:
+            existing = {os.path.normcase(entry.name) for entry in entries if entry.is_dir()}
+    else:
+        existing = None
+    fill_error = None
+    if fill_folder:
+        try:
+            fill_folder(path)
+        except Exception as e:
+            fill_error = e
+    return not exists, existing, fill_error
+
+
+def _make_batch(batch, fill_folder):
+    """Runs in a pool thread: _make_folder for each (path, exists, subtree) of a batch of siblings.
+
+    Returns one (result, error) per folder, so one failure does not stop its siblings.
+    """
+    results = []
+    for path, exists, subtree in batch:
+        try:
+            results.append((_make_folder(path, exists, len(subtree), fill_folder), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def _share_of(path):
+    """The drive, UNC share or root a path lives on; concurrency is bounded per share"""
+    return PurePath(path).anchor
+
+
+def make_folder_tree(tree, on_folder=None, fill_folder=None, max_workers=None):
+    """Create the folders of a prefix tree top-down, each one exactly once.
+
+    Folders that already exist are listed once to see which of their
+    children are missing (a single child is checked with one stat instead),
+    and only those are created, with one mkdir each; folders created here are
+    known to be empty and are not looked at again.
+
+    The children of a folder are submitted to a thread pool, in batches of
+    siblings, as soon as that folder exists, so every parent still comes
+    before its children. At most max_workers batches of one drive or share
+    are in flight at a time; on network shares, where every call waits for a
+    round trip, throughput grows with that number.
+
+    fill_folder(path), when given, runs in the pool right after a folder
+    exists, e.g. to write files into it. on_folder(path, error, fill_error) is
+    called on the calling thread for every folder of the tree: error is None
+    once it exists, and fill_error is what fill_folder raised, if anything.
+    Folders below one that failed are not attempted; a failed fill does not
+    stop them.
+    """
+    max_workers = max_workers or DEFAULT_FOLDER_WORKERS
+    pending = {}
+    in_flight = {}
+    # Finished futures are handed back through a queue, which stays cheap however many are in flight
+    finished = queue.SimpleQueue()
+
+    def add_children(share, folder, subtree, made, existing):
+        children = []
+        for name, grandchildren in subtree.items():
+            if made:
+                exists = False
+            elif existing is None:
+                exists = None
+            else:
+                exists = os.path.normcase(name) in existing
+            children.append((os.path.join(folder, name), exists, grandchildren))
+        # Small enough batches that a parent's children still spread over all workers
+        size = max(1, min(FOLDER_BATCH_SIZE, -(-len(children) // max_workers)))
+        stack = pending.setdefault(share, [])
+        stack.extend(children[start:start + size] for start in range(0, len(children), size))
+
+    for root, subtree in tree.items():
+        # Roots such as '/' or 'C:\\' exist; only their children need checking
+        try:
+            made, existing, _ = _make_folder(root, True, len(subtree), None)
+        except OSError as e:
+            _fail_subtree(root, subtree, e, on_folder, report_self=False)
+            continue
+        add_children(_share_of(root), root, subtree, made, existing)
+    share_load = dict.fromkeys(pending, 0)
+
+    with ThreadPoolExecutor(max_workers=max_workers * max(1, len(pending))) as executor:
+        while any(pending.values()) or in_flight:
+            for share, stack in pending.items():
+                while stack and share_load[share] < max_workers:
+                    batch = stack.pop()
+                    future = executor.submit(_make_batch, batch, fill_folder)
+                    in_flight[future] = (share, batch)
+                    share_load[share] += 1
+                    future.add_done_callback(finished.put)
+
+            future = finished.get()
+            share, batch = in_flight.pop(future)
+            share_load[share] -= 1
+            for (path, _, subtree), (result, error) in zip(batch, future.result()):
+                if error is not None:
+                    _fail_subtree(path, subtree, error, on_folder)
+                    continue
+                made, existing, fill_error = result
+                if on_folder:
+                    on_folder(path, None, fill_error)
+                add_children(share, path, subtree, made, existing)
+
+
+def _fail_subtree(folder, tree, error, on_folder, report_self=True):
+    if not on_folder:
+        return
+    if report_self:
+        on_folder(folder, error, None)
+    for name, subtree in tree.items():
+        _fail_subtree(os.path.join(folder, name), subtree, error, on_folder)
+
+
+def create_folders(items, create_readme=False, on_progress=None, max_workers=None, scaffold=None, snapshot=None):
+    """Create the folders of the ready plan items. Returns (created_count, errors).
+
+    Only Ready items are attempted, so applying a plan again creates just what
+    is still missing. The folders and all their missing parents are created
+    through one prefix tree (see make_folder_tree), with max_workers folders
+    per share in flight. README files and the starter files of scaffold (an
+    engine.scaffold.Scaffold) are written by the pool threads too. Each item's
+    status is updated; on_progress(item) is called on the calling thread after
+    each one. A folder whose files could not be written still counts as
+    created and is marked Files failed, with its own line in errors. The
+    created folders are recorded in snapshot, when given, so the next plan
+    does not list their parents again and does not fill them a second time.
+    """
+    ready, paths = {}, []
+    for item in items:
+        if item['status'] == STATUS_READY:
+            path = os.path.abspath(item['full_path'])
+            ready.setdefault(os.path.normcase(path), []).append(item)
+            paths.append(path)
+    created_count = 0
+    errors = []
+
+    def fill_folder(path):
+        for item in ready.get(os.path.normcase(path), ()):
+            if create_readme:
+                with open(os.path.join(path, README_NAME), 'w', encoding='utf-8') as f:
+                    f.write(f"Folder created by EruStudio.\nName: {item['name']}\nParent: {item['parent'] or 'N/A'}")
+            if scaffold is not None:
+                scaffold.seed(path, item)
+
+    def on_folder(path, error, fill_error):
+        nonlocal created_count
+        for item in ready.pop(os.path.normcase(path), ()):
+            if error is not None:
+                errors.append(f"{item['name']}: {error}")
+                item['status'] = STATUS_ERROR
+            elif fill_error is not None:
+                created_count += 1
+                errors.append(f"{item['name']}: folder created, but its files failed: {fill_error}")
+                item['status'] = STATUS_INCOMPLETE
+            else:
+                created_count += 1
+                item['status'] = STATUS_CREATED
+            if on_progress:
+                on_progress(item)
+
+    filling = create_readme or (scaffold is not None and len(scaffold))
+    make_folder_tree(build_folder_tree(paths), on_folder, fill_folder if filling else None, max_workers)
+    if snapshot is not None:
+        snapshot.record_created([item['full_path'] for item in items
+                                 if item['status'] in (STATUS_CREATED, STATUS_INCOMPLETE)])
+    return created_count, errors
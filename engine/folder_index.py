@@ -0,0 +1,98 @@
+"""
+Folder size index for EruStudio
+Walks folder trees once with os.scandir and keeps their sizes in memory.
+"""
+
+import os
+
+
+class FolderIndex:
+    """In-memory index of folder totals keyed by folder path.
+
+    Each entry holds the total size, file count and newest file mtime of a tree,
+    plus the mtime of every directory in it. Adding, removing or renaming anything
+    changes the mtime of the directory that holds it, so comparing those directory
+    mtimes tells whether the entry is out of date without touching any file.
+
+    Writing to an existing file does not change its directory's mtime, so an
+    entry does not notice files that grew or shrank in place. Call
+    invalidate() when sizes have to be exact, e.g. on a scan the user asked for.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def lookup(self, path):
+        """Return the indexed entry for path, without checking whether it is current"""
+        return self._entries.get(os.path.normpath(path))
+
+    def get(self, path):
+        """Return the entry for path, rescanning it first if it is missing or stale"""
+        path = os.path.normpath(path)
+        if self.is_stale(path):
+            return self.scan(path)
+        return self._entries[path]
+
+    def is_stale(self, path):
+        """True when path is not indexed or any directory in its tree has changed since it was scanned.
+
+        Files rewritten in place are not detected; see the class docstring.
+        """
+        entry = self._entries.get(os.path.normpath(path))
+        if entry is None:
+            return True
+        for dir_path, mtime_ns in entry['dirs'].items():
+            try:
+                if os.stat(dir_path).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def invalidate(self, path=None):
+        """Forget one folder, or everything when path is None"""
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(os.path.normpath(path), None)
+
+    def scan(self, path):
+        """Walk path once and index it. Subfolders that are already indexed and current are reused."""
+        root = os.path.normpath(path)
+        entry = {'size': 0, 'files': 0, 'mtime': 0.0, 'dirs': {}}
+        try:
+            stack = [(root, os.stat(root).st_mtime_ns)]
+        except OSError:
+            stack = []
+
+        while stack:
+            dir_path, dir_mtime_ns = stack.pop()
+            if dir_path != root and dir_path in self._entries and not self.is_stale(dir_path):
+                self._merge(entry, self._entries[dir_path])
+                continue
+            entry['dirs'][dir_path] = dir_mtime_ns
+            try:
+                with os.scandir(dir_path) as it:
+                    for item in it:
+                        try:
+                            if item.is_dir(follow_symlinks=False):
+                                stack.append((item.path, item.stat(follow_symlinks=False).st_mtime_ns))
+                            elif item.is_file():
+                                stat = item.stat()
+                                entry['size'] += stat.st_size
+                                entry['files'] += 1
+                                entry['mtime'] = max(entry['mtime'], stat.st_mtime)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+        self._entries[root] = entry
+        return entry
+
+    @staticmethod
+    def _merge(entry, other):
+        entry['size'] += other['size']
+        entry['files'] += other['files']
+        entry['mtime'] = max(entry['mtime'], other['mtime'])
+        entry['dirs'].update(other['dirs'])
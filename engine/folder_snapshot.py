@@ -0,0 +1,133 @@
+"""
+Folder snapshot for EruStudio
+Remembers what the folders of a folder plan contain, so plans are diffed in memory instead of stat-ing every path.
+"""
+
+import os
+import stat
+
+# What a snapshot knows about a path
+PATH_DIR = 'dir'
+PATH_FILE = 'file'
+PATH_MISSING = 'missing'
+# The path's folder is a file (or below one), so nothing can be created there
+PATH_BLOCKED = 'blocked'
+
+
+def _key(path):
+    return os.path.normcase(path)
+
+
+class FolderSnapshot:
+    """Listings of the folders a plan creates folders in, each taken once with os.scandir.
+
+    Every listed folder is kept with its modification time. Creating,
+    removing or renaming an entry changes that time, so refresh() only has to
+    stat each folder to see whether its listing is still current and lists
+    again just the ones that changed. After folders are created, record_created
+    adds them to the snapshot without listing anything.
+    """
+
+    def __init__(self):
+        # normcased folder -> {'state', 'mtime', 'dirs', 'files'}; names in dirs and files are normcased
+        self._folders = {}
+
+    def __len__(self):
+        return len(self._folders)
+
+    def clear(self):
+        self._folders.clear()
+
+    def refresh(self, folders):
+        """Make sure every folder is listed and current; returns how many were listed"""
+        listed = 0
+        for folder in folders:
+            entry = self._folders.get(_key(folder))
+            try:
+                # The trailing separator keeps 'C:' meaning the drive root and fails on files
+                folder_stat = os.stat(folder + os.sep)
+            except NotADirectoryError:
+                self._folders[_key(folder)] = {'state': PATH_BLOCKED, 'mtime': None, 'dirs': set(), 'files': set()}
+                continue
+            except OSError:
+                self._folders[_key(folder)] = {'state': PATH_MISSING, 'mtime': None, 'dirs': set(), 'files': set()}
+                continue
+            if not stat.S_ISDIR(folder_stat.st_mode):
+                self._folders[_key(folder)] = {'state': PATH_BLOCKED, 'mtime': None, 'dirs': set(), 'files': set()}
+                continue
+            if entry is not None and entry['state'] == PATH_DIR and entry['mtime'] == folder_stat.st_mtime_ns:
+                continue
+            self._folders[_key(folder)] = self._list(folder, folder_stat.st_mtime_ns)
+            listed += 1
+        return listed
+
+    @staticmethod
+    def _list(folder, mtime):
+        dirs, files = set(), set()
+        try:
+            with os.scandir(folder + os.sep) as entries:
+                for entry in entries:
+                    try:
+                        (dirs if entry.is_dir() else files).add(_key(entry.name))
+                    except OSError:
+                        files.add(_key(entry.name))
+        except OSError:
+            return {'state': PATH_MISSING, 'mtime': None, 'dirs': set(), 'files': set()}
+        return {'state': PATH_DIR, 'mtime': mtime, 'dirs': dirs, 'files': files}
+
+    def known_paths(self, folders):
+        """(dir_keys, file_keys, blocked_folder_keys) of the given folders, as normcased full paths"""
+        dir_keys, file_keys, blocked = set(), set(), set()
+        for folder in folders:
+            entry = self._folders.get(_key(folder))
+            if entry is None:
+                continue
+            prefix = _key(folder) + os.sep
+            if entry['state'] == PATH_BLOCKED:
+                blocked.add(_key(folder))
+            dir_keys.update(prefix + name for name in entry['dirs'])
+            file_keys.update(prefix + name for name in entry['files'])
+        return dir_keys, file_keys, blocked
+
+    def state_of(self, path):
+        """PATH_DIR, PATH_FILE, PATH_MISSING or PATH_BLOCKED for a path in a listed folder; None when its folder is unknown"""
+        folder, _, name = path.rpartition(os.sep)
+        entry = self._folders.get(_key(folder))
+        if entry is None:
+            return None
+        if entry['state'] != PATH_DIR:
+            return entry['state']
+        name = _key(name)
+        if name in entry['dirs']:
+            return PATH_DIR
+        return PATH_FILE if name in entry['files'] else PATH_MISSING
+
+    def record_created(self, paths):
+        """Add folders that were just created, and any missing parents made with them, without listing again"""
+        touched = set()
+        for path in paths:
+            created = self._folders.get(_key(path))
+            if created is not None and created['state'] != PATH_DIR:
+                created.update(state=PATH_DIR, dirs=set(), files=set())
+                touched.add(path)
+            child = path
+            while True:
+                folder, _, name = child.rpartition(os.sep)
+                if not name:
+                    break
+                entry = self._folders.get(_key(folder))
+                if entry is not None:
+                    was_listed = entry['state'] == PATH_DIR
+                    if not was_listed:
+                        entry.update(state=PATH_DIR, dirs=set(), files=set())
+                    entry['dirs'].add(_key(name))
+                    touched.add(folder)
+                    if was_listed:
+                        break
+                child = folder
+        # Our own changes moved these folders' modification times; take the new ones so the listings stay current
+        for folder in touched:
+            try:
+                self._folders[_key(folder)]['mtime'] = os.stat(folder + os.sep).st_mtime_ns
+            except OSError:
+                self._folders.pop(_key(folder), None)
@@ -0,0 +1,497 @@
+"""
+Multi-Zip engine for EruStudio
+UI-free archive building used by the Multi-Zip module.
+"""
+
+import os
+import struct
+import time
+import zlib
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from engine.compression_policy import get_policy
+from engine.folder_index import FolderIndex
+
+# Uncompressed bytes handed to a worker per job when one archive is split across workers
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Deflate window; each chunk is primed with this much of the data preceding it
+DEFLATE_WINDOW = 32 * 1024
+
+# Codecs whose output can be produced piece by piece and concatenated
+SPLITTABLE_TYPES = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+# Block size used when copying or checksumming member data
+COPY_BLOCK_SIZE = 1024 * 1024
+
+STATUS_READY = "✅ Ready"
+STATUS_EXISTS = "⚠️ Exists"
+
+TEMPLATE_COLUMN = 'Folder Name'
+
+
+def default_worker_count():
+    """Number of archives built at the same time unless the user picks another value"""
+    return max(1, os.cpu_count() or 1)
+
+
+def plan_zip_tasks(source_folder, output_folder, template_path=None, top_level_only=True, folder_index=None):
+    """Return one task dict per folder to archive.
+
+    With a template, the folders named in its 'Folder Name' column are used;
+    otherwise every top-level folder of source_folder, or source_folder itself
+    when top_level_only is False. Sizes come from folder_index.
+    """
+    folder_index = folder_index if folder_index is not None else FolderIndex()
+    folders_to_process = []
+    base_path = source_folder
+
+    if template_path:
+        import pandas as pd  # only needed for templates; keeps pool workers light
+        df = pd.read_excel(template_path)
+        if TEMPLATE_COLUMN not in df.columns:
+            raise ValueError(f"Template must have a '{TEMPLATE_COLUMN}' column.")
+        for folder_name in df[TEMPLATE_COLUMN].dropna().astype(str):
+            full_path = os.path.join(source_folder, folder_name)
+            if os.path.isdir(full_path):
+                folders_to_process.append((folder_name, full_path))
+    elif top_level_only:
+        for d in os.listdir(source_folder):
+            full_path = os.path.join(source_folder, d)
+            if os.path.isdir(full_path):
+                folders_to_process.append((d, full_path))
+    else:
+        folders_to_process.append((os.path.basename(source_folder), source_folder))
+        base_path = os.path.dirname(source_folder)
+
+    tasks = []
+    for folder_name, full_path in folders_to_process:
+        stats = folder_index.get(full_path)
+        zip_path = os.path.join(output_folder, f"{folder_name}.zip")
+        status = STATUS_EXISTS if os.path.exists(zip_path) else STATUS_READY
+        tasks.append({'name': folder_name, 'path': full_path, 'rel_path': os.path.relpath(full_path, base_path),
+                      'zip_path': zip_path, 'size': stats['size'], 'files': stats['files'], 'status': status})
+    return tasks
+
+
+def iter_folder_files(folder_path, base_folder):
+    """Yield (file_path, arcname) for every file below folder_path"""
+    for root, _, files in os.walk(folder_path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            yield file_path, os.path.relpath(file_path, base_folder)
+
+
+def zip_folder(folder_path, zip_path, include_root_dir=False, policy=None):
+    """Write one archive for folder_path and return a summary of what went into it.
+
+    Runs inside pool workers, so it only takes plain arguments and never touches Tk.
+    A partially written archive is removed when zipping fails.
+    """
+    policy = get_policy(policy)
+    base_folder = os.path.dirname(folder_path) if include_root_dir else folder_path
+    summary = {'files': 0, 'bytes': 0, 'compressed_bytes': 0, 'stored_files': 0}
+    started = time.thread_time()
+    try:
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for file_path, arcname in iter_folder_files(folder_path, base_folder):
+                compress_type, level = policy.choose(file_path)
+                zipf.write(file_path, arcname, compress_type, level)
+                _count_member(summary, zipf.filelist[-1])
+    except Exception:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        raise
+    summary['cpu_seconds'] = time.thread_time() - started
+    return summary
+
+
+def _count_member(summary, zinfo):
+    summary['files'] += 1
+    summary['bytes'] += zinfo.file_size
+    summary['compressed_bytes'] += zinfo.compress_size
+    if zinfo.compress_type == zipfile.ZIP_STORED:
+        summary['stored_files'] += 1
+
+
+def crc32_combine(crc1, crc2, len2):
+    """Return the CRC-32 of A + B given crc32(A), crc32(B) and len(B), as zlib's crc32_combine does"""
+    if len2 <= 0:
+        return crc1
+
+    def times(matrix, vector):
+        total, index = 0, 0
+        while vector:
+            if vector & 1:
+                total ^= matrix[index]
+            vector >>= 1
+            index += 1
+        return total
+
+    def square(matrix):
+        return [times(matrix, matrix[n]) for n in range(32)]
+
+    odd = [0xEDB88320] + [1 << n for n in range(31)]
+    even = square(odd)
+    odd = square(even)
+    while True:
+        even = square(odd)
+        if len2 & 1:
+            crc1 = times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = square(even)
+        if len2 & 1:
+            crc1 = times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+
+def compress_pieces(pieces):
+    """Compress file pieces and return ([(crc, length, data), ...], cpu_seconds).
+
+    Runs inside pool workers. Each piece is (path, offset, length, is_last,
+    compress_type, level). A deflated piece that does not end its file is closed
+    with a sync flush, so the pieces of one file concatenate into a single valid
+    deflate stream. BZIP2 and LZMA members always arrive as one whole piece.
+    """
+    started = time.thread_time()
+    results = []
+    for path, offset, length, is_last, compress_type, level in pieces:
+        with open(path, 'rb') as f:
+            zdict = b''
+            if compress_type == zipfile.ZIP_DEFLATED:
+                window_start = max(0, offset - DEFLATE_WINDOW)
+                f.seek(window_start)
+                zdict = f.read(offset - window_start)
+            else:
+                f.seek(offset)
+            data = f.read(length)
+
+        if compress_type == zipfile.ZIP_STORED:
+            compressed = data
+        elif compress_type == zipfile.ZIP_DEFLATED:
+            level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+            if zdict:
+                compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+            else:
+                compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            compressed = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if is_last else zlib.Z_SYNC_FLUSH)
+        else:
+            compressor = zipfile._get_compressor(compress_type, level)
+            compressed = compressor.compress(data) + compressor.flush()
+        results.append((zlib.crc32(data), len(data), compressed))
+    return results, time.thread_time() - started
+
+
+def begin_raw_member(zipf, zinfo, zip64):
+    """Write the local header for a member whose data is already compressed"""
+    zinfo.flag_bits = 0x00
+    if zinfo.compress_type == zipfile.ZIP_LZMA:
+        # Compressed data includes an end-of-stream (EOS) marker
+        zinfo.flag_bits |= 0x02
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16
+    zinfo.header_offset = zipf.fp.tell()
+    zipf._writecheck(zinfo)
+    zipf._didModify = True
+    zipf.fp.write(zinfo.FileHeader(zip64))
+
+
+def finish_raw_member(zipf, zinfo, zip64):
+    """Rewrite the local header with the final sizes/CRC and register the member, like ZipFile.open('w') does"""
+    zipf.start_dir = zipf.fp.tell()
+    zipf.fp.seek(zinfo.header_offset)
+    zipf.fp.write(zinfo.FileHeader(zip64))
+    zipf.fp.seek(zipf.start_dir)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+
+
+def iter_compress_jobs(folder_path, base_folder, policy, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Split a folder into jobs of roughly chunk_size bytes.
+
+    Yields (pieces, members): pieces go to compress_pieces, and members holds the
+    ZipInfo each piece belongs to. Small files are packed together and large
+    stored/deflated files are cut into several pieces. A BZIP2/LZMA file too big
+    for one job is yielded on its own as (None, [(file_path, arcname, compress_type,
+    level)]) and written directly by the caller.
+    """
+    pieces, members, job_size = [], [], 0
+    for file_path, arcname in iter_folder_files(folder_path, base_folder):
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        compress_type, level = policy.choose(file_path)
+        zinfo.compress_type = compress_type
+        file_size = zinfo.file_size
+
+        if compress_type not in SPLITTABLE_TYPES:
+            if file_size > chunk_size:
+                if pieces:
+                    yield pieces, members
+                    pieces, members, job_size = [], [], 0
+                yield None, [(file_path, arcname, compress_type, level)]
+                continue
+            pieces.append((file_path, 0, file_size, True, compress_type, level))
+            members.append(zinfo)
+            job_size += file_size
+        else:
+            offset = 0
+            while True:
+                length = min(chunk_size - job_size, file_size - offset)
+                is_last = offset + length >= file_size
+                pieces.append((file_path, offset, length, is_last, compress_type, level))
+                members.append(zinfo)
+                job_size += length
+                offset += length
+                if job_size >= chunk_size:
+                    yield pieces, members
+                    pieces, members, job_size = [], [], 0
+                if is_last:
+                    break
+
+        if job_size >= chunk_size:
+            yield pieces, members
+            pieces, members, job_size = [], [], 0
+    if pieces:
+        yield pieces, members
+
+
+def _write_compressed_job(zipf, state, summary, future, pieces, members):
+    """Append one finished job to the archive, updating the running summary"""
+    if future is None:
+        started = time.thread_time()
+        zipf.write(*members[0])
+        summary['cpu_seconds'] += time.thread_time() - started
+        _count_member(summary, zipf.filelist[-1])
+        return
+
+    results, cpu_seconds = future.result()
+    summary['cpu_seconds'] += cpu_seconds
+    for (_, offset, _, is_last, _, _), zinfo, (crc, length, compressed) in zip(pieces, members, results):
+        if offset == 0:
+            state['zip64'] = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+            state['crc'] = 0
+            zinfo.file_size = zinfo.compress_size = zinfo.CRC = 0
+            begin_raw_member(zipf, zinfo, state['zip64'])
+        zipf.fp.write(compressed)
+        state['crc'] = crc32_combine(state['crc'], crc, length)
+        zinfo.file_size += length
+        zinfo.compress_size += len(compressed)
+        if is_last:
+            zinfo.CRC = state['crc']
+            finish_raw_member(zipf, zinfo, state['zip64'])
+            _count_member(summary, zinfo)
+
+
+def zip_folder_parallel(folder_path, zip_path, executor, include_root_dir=False, policy=None, window=None,
+                        chunk_size=DEFAULT_CHUNK_SIZE, on_progress=None):
+    """Write one archive whose members are compressed by the workers of executor.
+
+    Jobs are submitted in order with at most window of them in flight, and their
+    results are written back in the same order, so memory stays bounded and the
+    archive is an ordinary ZIP (ZIP64 when needed). on_progress(bytes_done) fires
+    after each job is written.
+    """
+    policy = get_policy(policy)
+    base_folder = os.path.dirname(folder_path) if include_root_dir else folder_path
+    window = window or 2 * default_worker_count()
+    state = {'zip64': False, 'crc': 0}
+    summary = {'files': 0, 'bytes': 0, 'compressed_bytes': 0, 'stored_files': 0, 'cpu_seconds': 0.0}
+    in_flight = deque()
+
+    def write_next():
+        _write_compressed_job(zipf, state, summary, *in_flight.popleft())
+        if on_progress:
+            on_progress(summary['bytes'])
+
+    try:
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for pieces, members in iter_compress_jobs(folder_path, base_folder, policy, chunk_size):
+                future = executor.submit(compress_pieces, pieces) if pieces else None
+                in_flight.append((future, pieces, members))
+                while len(in_flight) >= window or (in_flight and (in_flight[0][0] is None or in_flight[0][0].done())):
+                    write_next()
+            while in_flight:
+                write_next()
+    except Exception:
+        for future, _, _ in in_flight:
+            if future is not None:
+                future.cancel()
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        raise
+    return summary
+
+
+def _same_zip_time(date_time1, date_time2):
+    """Compare two ZIP timestamps at the 2-second resolution the format stores"""
+    return date_time1[:5] == date_time2[:5] and date_time1[5] // 2 == date_time2[5] // 2
+
+
+def _file_crc32(file_path):
+    crc = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(COPY_BLOCK_SIZE)
+            if not block:
+                return crc
+            crc = zlib.crc32(block, crc)
+
+
+def copy_raw_member(source_zip, source_info, zipf, zinfo):
+    """Copy a member's compressed bytes from source_zip into zipf without recompressing them.
+
+    zinfo supplies the name, timestamp and attributes of the new entry; codec,
+    CRC and sizes are taken from source_info.
+    """
+    source_zip.fp.seek(source_info.header_offset)
+    header = source_zip.fp.read(zipfile.sizeFileHeader)
+    if header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local header for {source_info.filename}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    data_offset = source_info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+
+    zinfo.compress_type = source_info.compress_type
+    zinfo.CRC = source_info.CRC
+    zinfo.file_size = source_info.file_size
+    zinfo.compress_size = source_info.compress_size
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    begin_raw_member(zipf, zinfo, zip64)
+
+    source_zip.fp.seek(data_offset)
+    remaining = source_info.compress_size
+    while remaining:
+        block = source_zip.fp.read(min(COPY_BLOCK_SIZE, remaining))
+        if not block:
+            raise zipfile.BadZipFile(f"Truncated data for {source_info.filename}")
+        zipf.fp.write(block)
+        remaining -= len(block)
+    finish_raw_member(zipf, zinfo, zip64)
+
+
+def update_zip_folder(folder_path, zip_path, include_root_dir=False, policy=None):
+    """Bring an existing archive in line with folder_path, recompressing only what changed.
+
+    The archive's central directory is compared with the folder: members whose
+    size and timestamp still match (or whose CRC still matches after a touch) are
+    copied over as already-compressed bytes, new and changed files are compressed
+    with the policy, and members whose file is gone are dropped. The result is
+    written next to the archive and swapped in only when complete. Falls back to
+    a full build when there is no readable archive yet.
+    """
+    if not os.path.exists(zip_path):
+        return zip_folder(folder_path, zip_path, include_root_dir, policy)
+    try:
+        source_zip = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile:
+        return zip_folder(folder_path, zip_path, include_root_dir, policy)
+
+    policy = get_policy(policy)
+    base_folder = os.path.dirname(folder_path) if include_root_dir else folder_path
+    temp_path = zip_path + '.tmp'
+    summary = {'files': 0, 'bytes': 0, 'compressed_bytes': 0, 'stored_files': 0,
+               'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+    started = time.thread_time()
+    try:
+        with source_zip, zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            existing = {info.filename: info for info in source_zip.infolist() if not info.is_dir()}
+            for file_path, arcname in iter_folder_files(folder_path, base_folder):
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+                old_info = existing.pop(zinfo.filename, None)
+                reusable = (old_info is not None and not old_info.flag_bits & 0x01
+                            and old_info.file_size == zinfo.file_size
+                            and (_same_zip_time(old_info.date_time, zinfo.date_time)
+                                 or old_info.CRC == _file_crc32(file_path)))
+                if reusable:
+                    copy_raw_member(source_zip, old_info, zipf, zinfo)
+                    summary['unchanged'] += 1
+                else:
+                    compress_type, level = policy.choose(file_path)
+                    zipf.write(file_path, arcname, compress_type, level)
+                    summary['added' if old_info is None else 'updated'] += 1
+                _count_member(summary, zipf.filelist[-1])
+            summary['removed'] = len(existing)
+        os.replace(temp_path, zip_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    summary['cpu_seconds'] = time.thread_time() - started
+    return summary
+
+
+def run_zip_tasks(tasks, include_root_dir=False, max_workers=None, use_processes=True, split_members=False,
+                  policy=None, incremental=False, on_start=None, on_done=None, on_progress=None):
+    """Zip every task concurrently and return (processed_count, errors).
+
+    Only max_workers archives are in flight at once, so a task is reported through
+    on_start(task) when a worker actually picks it up. on_done(task, result, error)
+    fires as each archive finishes, in completion order; result is the summary
+    returned by zip_folder. Both callbacks run on the calling thread; UI callers
+    should marshal them onto the Tk loop themselves.
+
+    With split_members the archives are built one after another instead, each one
+    spreading its members over all workers; on_progress(task, bytes_done) then
+    reports progress inside the current archive.
+
+    policy is a CompressionPolicy or the name of one in POLICIES. With incremental,
+    archives that already exist are updated through update_zip_folder instead of
+    being rebuilt.
+    """
+    policy = get_policy(policy)
+    max_workers = max_workers or default_worker_count()
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    pending_tasks = list(tasks)
+    pending_tasks.reverse()
+    processed_count = 0
+    errors = []
+
+    with executor_class(max_workers=max_workers) as executor:
+        if split_members:
+            for task in tasks:
+                if on_start:
+                    on_start(task)
+                progress = (lambda done, task=task: on_progress(task, done)) if on_progress else None
+                try:
+                    if incremental and os.path.exists(task['zip_path']):
+                        result = executor.submit(update_zip_folder, task['path'], task['zip_path'], include_root_dir, policy).result()
+                    else:
+                        result = zip_folder_parallel(task['path'], task['zip_path'], executor, include_root_dir, policy,
+                                                     window=2 * max_workers, on_progress=progress)
+                    error = None
+                    processed_count += 1
+                except Exception as e:
+                    result, error = None, e
+                    errors.append(f"{task['name']}: {e}")
+                if on_done:
+                    on_done(task, result, error)
+            return processed_count, errors
+
+        in_flight = {}
+        while pending_tasks or in_flight:
+            while pending_tasks and len(in_flight) < max_workers:
+                task = pending_tasks.pop()
+                zip_function = update_zip_folder if incremental else zip_folder
+                future = executor.submit(zip_function, task['path'], task['zip_path'], include_root_dir, policy)
+                in_flight[future] = task
+                if on_start:
+                    on_start(task)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = in_flight.pop(future)
+                try:
+                    result, error = future.result(), None
+                    processed_count += 1
+                except Exception as e:
+                    result, error = None, e
+                    errors.append(f"{task['name']}: {e}")
+                if on_done:
+                    on_done(task, result, error)
+
+    return processed_count, errors
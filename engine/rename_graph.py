@@ -0,0 +1,131 @@
+"""
+Rename ordering for EruStudio
+Turns a batch of renames inside one folder into a sequence of steps that can be applied one by one.
+"""
+
+import os
+import sys
+import tempfile
+
+# Temporary names used to break rename cycles; the leading dot keeps them out of previews
+TEMP_PREFIX = '.erustudio_tmp_'
+
+CONFLICT_EXISTS = "⚠️ Target Exists"
+CONFLICT_DUPLICATE = "❌ Duplicate Target"
+CONFLICT_BLOCKED = "⚠️ Blocked"
+
+
+def is_case_insensitive(folder):
+    """True when names in folder are matched case-insensitively (default on Windows and macOS)"""
+    try:
+        with tempfile.NamedTemporaryFile(prefix='.ErUsTuDiO_', dir=folder) as probe:
+            return os.path.exists(os.path.join(folder, os.path.basename(probe.name).lower()))
+    except OSError:
+        return sys.platform in ('win32', 'darwin')
+
+
+def solve_renames(renames, existing_names, case_insensitive=False):
+    """Order a batch of (current, new) renames so that none overwrites another.
+
+    Each name can be the target of at most one rename, so the batch forms
+    chains (a->b, b->c) and cycles (a->b, b->a, including case-only renames on
+    case-insensitive file systems). Chains are applied from their free end;
+    each cycle is opened by moving one member to a temporary name first.
+
+    existing_names lists every entry currently in the folder. Returns
+    (steps, conflicts): steps is the ordered list of (src, dst) pairs and
+    conflicts maps each rename that cannot run to its reason. Everything is
+    done with hash lookups, so it is linear in the size of the batch.
+    """
+    key = str.casefold if case_insensitive else (lambda name: name)
+
+    targets = {}
+    conflicts = {}
+    for src, dst in renames:
+        if src == dst:
+            continue
+        dst_key = key(dst)
+        if dst_key in targets:
+            conflicts[src] = CONFLICT_DUPLICATE
+            conflicts[targets[dst_key]] = CONFLICT_DUPLICATE
+        else:
+            targets[dst_key] = src
+
+    # source key -> rename, for everything still runnable
+    moves = {key(src): (src, dst) for src, dst in renames if src != dst and src not in conflicts}
+    existing = {key(name) for name in existing_names}
+
+    # A target may only be taken if it is free now or is itself being renamed away
+    for src_key, (src, dst) in list(moves.items()):
+        dst_key = key(dst)
+        if dst_key in existing and dst_key not in moves:
+            conflicts[src] = CONFLICT_EXISTS
+
+    # Renames waiting on one that cannot run are blocked as well
+    waiting_on = {key(dst): src_key for src_key, (src, dst) in moves.items()}
+    stack = [key(src) for src in conflicts]
+    while stack:
+        blocked_key = waiting_on.get(stack.pop())
+        if blocked_key is not None and blocked_key in moves:
+            src = moves[blocked_key][0]
+            if src not in conflicts:
+                conflicts[src] = CONFLICT_BLOCKED
+            stack.append(blocked_key)
+    for src in conflicts:
+        moves.pop(key(src), None)
+
+    steps = []
+    done = set()
+    taken = existing | {key(dst) for src, dst in moves.values()}
+    temp_counter = 0
+
+    def walk_back(src_key):
+        """Apply the rename at src_key, then everything that was waiting for its name to become free"""
+        while src_key is not None and src_key not in done:
+            done.add(src_key)
+            steps.append(moves[src_key])
+            src_key = waiting_on.get(src_key)
+            if src_key is not None and src_key not in moves:
+                src_key = None
+
+    # Chains: start from renames whose target is not a source in the batch
+    for src_key, (src, dst) in moves.items():
+        if key(dst) not in moves:
+            walk_back(src_key)
+
+    # Whatever is left forms cycles
+    for src_key, (src, dst) in moves.items():
+        if src_key in done:
+            continue
+        while True:
+            temp_name = f"{TEMP_PREFIX}{temp_counter}"
+            temp_counter += 1
+            if key(temp_name) not in taken:
+                break
+        taken.add(key(temp_name))
+        steps.append((src, temp_name))
+        done.add(src_key)
+        # The first member's name is now free, so the rest of the cycle unwinds behind it
+        walk_back(waiting_on.get(src_key))
+        steps.append((temp_name, dst))
+
+    return steps, conflicts
+
+
+def solve_tree_renames(root, renames, case_insensitive=False):
+    """solve_renames for (src, dst) paths relative to root, where each dst stays in its src folder.
+
+    Each folder is solved against its own listing, deepest folders first, so a
+    folder is only renamed after everything inside it.
+    """
+    by_parent = {}
+    for src, dst in renames:
+        by_parent.setdefault(os.path.dirname(src), []).append((os.path.basename(src), os.path.basename(dst)))
+
+    steps, conflicts = [], {}
+    depth = lambda parent: parent.count(os.sep) + 1 if parent else 0
+    for parent in sorted(by_parent, key=depth, reverse=True):
+        folder_steps, folder_conflicts = solve_renames(by_parent[parent], os.listdir(os.path.join(root, parent)), case_insensitive)
+        steps.extend((os.path.join(parent, src), os.path.join(parent, dst)) for src, dst in folder_steps)
+        conflicts.update((os.path.join(parent, src), reason) for src, reason in folder_conflicts.items())
+    return steps, conflicts
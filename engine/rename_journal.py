@@ -0,0 +1,234 @@
+"""
+Rename journal for EruStudio
+Crash-safe, undoable batches of renames inside one folder.
+
+A batch runs in two phases. First every planned rename is appended to a journal
+file and synced to disk; then the renames are applied in order, with progress
+records synced every few hundred renames. After a crash the journal tells which
+renames are still pending, so the batch can be resumed or rolled back. No file
+data is ever copied.
+"""
+
+import json
+import os
+import time
+
+# Journals live next to the files they rename; the leading dot keeps them out of previews
+JOURNAL_PREFIX = '.erustudio_rename_'
+JOURNAL_SUFFIX = '.journal'
+
+# Committed journals kept per folder for undo; older ones, and rolled-back ones, are deleted
+KEEP_COMMITTED = 5
+
+# Progress records are synced to disk once per this many renames
+FSYNC_BATCH = 256
+
+STATE_PENDING = 'pending'
+STATE_COMMITTED = 'committed'
+STATE_ROLLED_BACK = 'rolled_back'
+
+
+def _fsync_dir(folder):
+    """Make renames inside folder durable; not supported (or needed) on every platform"""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class RenameJournal:
+    """Append-only journal of one rename batch.
+
+    Each line is a JSON record: 'begin', one 'intent' per rename, then 'done'
+    and 'undone' progress records and finally 'commit' or 'rollback'. A torn
+    last line left by a crash is ignored when the journal is loaded.
+    """
+
+    def __init__(self, path, folder, operations, state=STATE_PENDING, valid_size=None):
+        self.path = path
+        self.folder = folder
+        self.operations = operations
+        self.state = state
+        self._valid_size = valid_size
+        self._file = None
+        self._unsynced = 0
+
+    @classmethod
+    def create(cls, folder, renames):
+        """Write the intent records for renames (pairs of names inside folder) and sync them"""
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(folder, f"{JOURNAL_PREFIX}{stamp}{JOURNAL_SUFFIX}")
+        counter = 1
+        while os.path.exists(path):
+            path = os.path.join(folder, f"{JOURNAL_PREFIX}{stamp}_{counter:03d}{JOURNAL_SUFFIX}")
+            counter += 1
+        operations = [{'seq': seq, 'src': src, 'dst': dst, 'done': False} for seq, (src, dst) in enumerate(renames)]
+        journal = cls(path, folder, operations)
+        journal._append({'op': 'begin', 'folder': folder, 'count': len(operations), 'time': time.time()})
+        for op in operations:
+            journal._append({'op': 'intent', 'seq': op['seq'], 'src': op['src'], 'dst': op['dst']})
+        journal.sync()
+        return journal
+
+    @classmethod
+    def load(cls, path):
+        folder, operations, state = os.path.dirname(path), [], STATE_PENDING
+        valid_size = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write at the end of the file
+                valid_size += len(line)
+                op = record.get('op')
+                if op == 'intent':
+                    operations.append({'seq': record['seq'], 'src': record['src'], 'dst': record['dst'], 'done': False})
+                elif op in ('done', 'undone'):
+                    operations[record['seq']]['done'] = op == 'done'
+                elif op == 'commit':
+                    state = STATE_COMMITTED
+                elif op == 'rollback':
+                    state = STATE_ROLLED_BACK
+        return cls(path, folder, operations, state, valid_size)
+
+    def _append(self, record):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if self._valid_size is not None:
+                self._file.truncate(self._valid_size)  # drop a torn record before appending
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._unsynced += 1
+
+    def sync(self):
+        """Flush buffered records to disk, together with the renames they describe"""
+        if self._file is None or not self._unsynced:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        _fsync_dir(self.folder)
+        self._unsynced = 0
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _record(self, record):
+        self._append(record)
+        if self._unsynced >= FSYNC_BATCH:
+            self.sync()
+
+    def _finish(self, op, state):
+        self._append({'op': op, 'time': time.time()})
+        self.close()
+        self.state = state
+        prune_journals(self.folder)
+
+    def pending_count(self):
+        return sum(1 for op in self.operations if not op['done'])
+
+    def done_count(self):
+        return sum(1 for op in self.operations if op['done'])
+
+    def _settle(self, op):
+        """Catch up with a rename that happened just before a crash but was never recorded"""
+        src = os.path.join(self.folder, op['src'])
+        dst = os.path.join(self.folder, op['dst'])
+        if not op['done'] and not os.path.lexists(src) and os.path.lexists(dst):
+            op['done'] = True
+            self._record({'op': 'done', 'seq': op['seq']})
+
+    def apply(self, on_progress=None):
+        """Apply every pending rename in order. Returns (renamed_count, errors)."""
+        renamed, errors = 0, []
+        for op in self.operations:
+            self._settle(op)
+            if op['done']:
+                continue
+            src = os.path.join(self.folder, op['src'])
+            dst = os.path.join(self.folder, op['dst'])
+            try:
+                if os.path.lexists(dst):
+                    raise FileExistsError(f"Target file '{op['dst']}' already exists.")
+                os.rename(src, dst)
+                op['done'] = True
+                self._record({'op': 'done', 'seq': op['seq']})
+                renamed += 1
+            except OSError as e:
+                errors.append(f"{op['src']} -> {op['dst']}: {e}")
+            if on_progress:
+                on_progress(op)
+        self._finish('commit', STATE_COMMITTED)
+        return renamed, errors
+
+    def rollback(self, on_progress=None):
+        """Undo every applied rename, newest first. Returns (restored_count, errors)."""
+        restored, errors = 0, []
+        if self.state == STATE_PENDING:
+            for op in self.operations:
+                self._settle(op)
+        for op in reversed(self.operations):
+            if not op['done']:
+                continue
+            src = os.path.join(self.folder, op['src'])
+            dst = os.path.join(self.folder, op['dst'])
+            try:
+                if os.path.lexists(src):
+                    raise FileExistsError(f"'{op['src']}' already exists.")
+                os.rename(dst, src)
+                op['done'] = False
+                self._record({'op': 'undone', 'seq': op['seq']})
+                restored += 1
+            except OSError as e:
+                errors.append(f"{op['dst']} -> {op['src']}: {e}")
+            if on_progress:
+                on_progress(op)
+        self._finish('rollback', STATE_ROLLED_BACK)
+        return restored, errors
+
+
+def find_journals(folder, state=None):
+    """Return the journals in folder, newest first, optionally only those in the given state"""
+    try:
+        names = [name for name in os.listdir(folder) if name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_SUFFIX)]
+    except OSError:
+        return []
+    journals = []
+    for name in sorted(names, reverse=True):
+        try:
+            journal = RenameJournal.load(os.path.join(folder, name))
+        except (OSError, KeyError, IndexError):
+            continue
+        if state is None or journal.state == state:
+            journals.append(journal)
+    return journals
+
+
+def prune_journals(folder, keep=KEEP_COMMITTED):
+    """Delete finished journals except the newest keep committed ones; pending journals are never touched.
+
+    Returns how many were deleted.
+    """
+    deleted, kept = 0, 0
+    for journal in find_journals(folder):
+        if journal.state == STATE_PENDING:
+            continue
+        if journal.state == STATE_COMMITTED and kept < keep:
+            kept += 1
+            continue
+        try:
+            os.remove(journal.path)
+            deleted += 1
+        except OSError:
+            pass
+    return deleted
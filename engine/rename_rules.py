@@ -0,0 +1,137 @@
+"""
+Rename rules for EruStudio
+Pattern-based new names for Bulk Rename, compiled once and applied to every entry of a tree walk.
+"""
+
+import fnmatch
+import os
+import re
+import string
+from datetime import datetime
+
+MODE_GLOB = 'Glob'
+MODE_REGEX = 'Regex'
+MODE_REPLACE = 'Replace'
+MODES = (MODE_GLOB, MODE_REGEX, MODE_REPLACE)
+
+CASE_KEEP = 'Keep case'
+CASE_LOWER = 'lowercase'
+CASE_UPPER = 'UPPERCASE'
+CASE_TITLE = 'Title Case'
+CASES = (CASE_KEEP, CASE_LOWER, CASE_UPPER, CASE_TITLE)
+
+# Fields available in templates besides regex groups ({g1}, {g2}, ... and named groups)
+TEMPLATE_FIELDS = ('name', 'ext', 'parent', 'n', 'date', 'created', 'size')
+
+# Fields that need a stat() call per entry
+STAT_FIELDS = {'date', 'created', 'size'}
+
+# Fields holding datetimes, formatted with strftime codes
+DATE_FIELDS = {'date', 'created'}
+
+_CASE_FUNCTIONS = {
+    CASE_LOWER: str.lower,
+    CASE_UPPER: str.upper,
+    CASE_TITLE: str.title,
+}
+
+
+def _sample_values(group_fields):
+    """A value of the right type for every template field"""
+    now = datetime.now()
+    values = {'name': 'name', 'ext': '.txt', 'parent': 'parent', 'n': 1, 'date': now, 'created': now, 'size': 0}
+    values.update(dict.fromkeys(group_fields, 'group'))
+    return values
+
+
+def _field_format(field, conversion, spec):
+    """The '{field!conversion:spec}' text of one parsed template field"""
+    return f"{{{field}{'!' + conversion if conversion else ''}{':' + spec if spec else ''}}}"
+
+
+class RenameRule:
+    """A compiled rename rule.
+
+    Glob and Regex rules select entries by name and build the new name from
+    template, e.g. '{parent}_{n:04d}{ext}' or 'IMG_{date:%Y%m%d}_{g1}{ext}'.
+    Replace rules substitute every regex match in the name with template
+    (backreferences such as \\1 work in its own text, not in inserted names).
+    case then folds the result. The counter {n} advances once per matched
+    entry, in walk order.
+    """
+
+    def __init__(self, pattern='*', mode=MODE_GLOB, template='{name}{ext}', case=CASE_KEEP,
+                 counter_start=1, counter_step=1, ignore_case=True):
+        if mode not in MODES:
+            raise ValueError(f"Unknown rule mode '{mode}'. Choose from: {', '.join(MODES)}")
+        flags = re.IGNORECASE if ignore_case else 0
+        try:
+            if mode == MODE_GLOB:
+                self.regex = re.compile(fnmatch.translate(pattern), flags)
+            else:
+                self.regex = re.compile(pattern, flags)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern '{pattern}': {e}")
+
+        try:
+            parsed = [(field, conversion, spec) for _, field, spec, conversion in string.Formatter().parse(template) if field]
+        except ValueError as e:
+            raise ValueError(f"Invalid template '{template}': {e}")
+        fields = {field.split('.')[0].split('[')[0] for field, _, _ in parsed}
+        group_fields = {f"g{i}" for i in range(1, self.regex.groups + 1)} | set(self.regex.groupindex)
+        unknown = fields - set(TEMPLATE_FIELDS) - group_fields
+        if unknown:
+            raise ValueError(f"Unknown template field(s): {', '.join(sorted(unknown))}. "
+                             f"Use {', '.join(TEMPLATE_FIELDS)} or regex groups g1, g2, ...")
+        # Format every field once with a value of its type, so a bad spec such as {n:%Y} fails here, not mid-walk
+        samples = _sample_values(group_fields)
+        for field, conversion, spec in parsed:
+            try:
+                _field_format(field, conversion, spec).format_map(samples)
+            except (ValueError, TypeError, KeyError, IndexError, AttributeError) as e:
+                raise ValueError(f"Invalid format for template field '{field}': {e}")
+            # Dates accept any spec, but one without strftime codes renders as itself: {date:d} gives 'd'
+            if field in DATE_FIELDS and not conversion and spec and '%' not in spec and '{' not in spec:
+                raise ValueError(f"Invalid format for template field '{field}': "
+                                 f"use strftime codes such as {{{field}:%Y%m%d}}")
+
+        self.mode = mode
+        self.template = template
+        # (literal text, field format or '') pairs; Replace expands backreferences in the literal text only
+        self.template_parts = [(literal, _field_format(field, conversion, spec) if field else '')
+                               for literal, field, spec, conversion in string.Formatter().parse(template)]
+        self.case_function = _CASE_FUNCTIONS.get(case)
+        self.needs_stat = bool(fields & STAT_FIELDS)
+        self.counter_start = counter_start
+        self.counter_step = counter_step
+        self.counter = counter_start
+
+    def reset(self):
+        """Restart the counter before a new plan"""
+        self.counter = self.counter_start
+
+    def apply(self, name, parent, stat_result=None):
+        """Return the new name for an entry, or None if the rule does not select it"""
+        match = self.regex.search(name) if self.mode != MODE_GLOB else self.regex.match(name)
+        if match is None:
+            return None
+
+        stem, ext = os.path.splitext(name)
+        values = {'name': stem, 'ext': ext, 'parent': parent, 'n': self.counter}
+        if stat_result is not None:
+            values['date'] = datetime.fromtimestamp(stat_result.st_mtime)
+            values['created'] = datetime.fromtimestamp(stat_result.st_ctime)
+            values['size'] = stat_result.st_size
+        for i, group in enumerate(match.groups(), 1):
+            values[f"g{i}"] = group or ''
+        values.update({key: value or '' for key, value in match.groupdict().items()})
+        self.counter += self.counter_step
+
+        if self.mode == MODE_REPLACE:
+            # Names and folders may hold backslashes, so inserted values never go through the regex replacement syntax
+            inserted = [field.format_map(values) if field else '' for _, field in self.template_parts]
+            new_name = self.regex.sub(lambda each: ''.join(each.expand(literal) + value for (literal, _), value
+                                                           in zip(self.template_parts, inserted)), name)
+        else:
+            new_name = self.template.format_map(values)
+        return self.case_function(new_name) if self.case_function else new_name
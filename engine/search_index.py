@@ -0,0 +1,118 @@
+"""
+Preview search index for EruStudio
+Substring search over the preview rows of the Bulk Rename, Multi-Zip and Folder Creator modules.
+"""
+
+import bisect
+from array import array
+
+# Separates keys in the joined text; never typed into a search box
+KEY_SEPARATOR = '\x00'
+
+# Below this query length almost every row matches, so a plain scan is cheaper than the text index
+MIN_INDEXED_QUERY = 3
+
+# Once more than 1 in this many rows has matched, finish the search with a plain scan
+DENSE_MATCH_RATIO = 20
+
+
+class SearchIndex:
+    """Case-insensitive substring search over a growing list of rows.
+
+    Each row is reduced once to a lowercase key. For full searches the keys are
+    joined into one string, so str.find can jump straight from one matching row
+    to the next. The previous result is remembered: a query that contains the
+    last one only re-checks the last matches, and repeating a query after rows
+    were appended only scans the new rows.
+    """
+
+    def __init__(self, keys=()):
+        self.keys = []
+        self._text = None
+        self._starts = array('q')
+        self._last_query = None
+        self._last_results = None
+        self._last_count = 0
+        self.extend(keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def extend(self, keys):
+        """Append rows; each key is a string or a tuple of strings to search in"""
+        for key in keys:
+            if not isinstance(key, str):
+                key = KEY_SEPARATOR.join(str(part) for part in key)
+            self.keys.append(key.lower())
+
+    def clear(self):
+        self.keys = []
+        self._text = None
+        self._starts = array('q')
+        self._forget()
+
+    def _forget(self):
+        self._last_query = None
+        self._last_results = None
+        self._last_count = 0
+
+    def search(self, query):
+        """Return the indices of matching rows in order, or None for an empty query.
+
+        The returned list is owned by the index: the same list is extended in
+        place when the query is repeated after new rows were added.
+        """
+        query = query.lower()
+        if not query:
+            self._forget()
+            return None
+
+        last = self._last_query
+        if last == query:
+            results = self._last_results
+            results.extend(self._scan(query, self._last_count))
+        elif last and last in query:
+            keys = self.keys
+            results = [i for i in self._last_results if query in keys[i]]
+            results.extend(self._scan(query, self._last_count))
+        else:
+            results = self._search_all(query)
+
+        self._last_query, self._last_results, self._last_count = query, results, len(self.keys)
+        return results
+
+    def _scan(self, query, start=0):
+        keys = self.keys
+        return [i for i in range(start, len(keys)) if query in keys[i]]
+
+    def _build_text(self):
+        starts = array('q')
+        position = 0
+        for key in self.keys:
+            starts.append(position)
+            position += len(key) + 1
+        self._text = KEY_SEPARATOR.join(self.keys) + KEY_SEPARATOR
+        self._starts = starts
+
+    def _search_all(self, query):
+        if len(query) < MIN_INDEXED_QUERY or KEY_SEPARATOR in query:
+            return self._scan(query)
+        if self._text is None or len(self._starts) != len(self.keys):
+            self._build_text()
+
+        text, starts = self._text, self._starts
+        count = len(starts)
+        dense_limit = max(1, count // DENSE_MATCH_RATIO)
+        results = []
+        position = text.find(query)
+        while position != -1:
+            row = bisect.bisect_right(starts, position) - 1
+            results.append(row)
+            if row + 1 >= count:
+                break
+            if len(results) > dense_limit:
+                # Matches are everywhere; jumping between them costs more than scanning
+                results.extend(self._scan(query, row + 1))
+                break
+            position = text.find(query, starts[row + 1])
+        return results
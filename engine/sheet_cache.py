@@ -0,0 +1,142 @@
+"""
+Sheet cache for EruStudio
+Keep parsed worksheets on disk as Feather files so unchanged workbooks are not parsed again.
+"""
+
+import hashlib
+import json
+import os
+
+# Bump when the way sheets are parsed or typed changes, so old entries are no longer used
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+CACHE_EXTENSION = '.feather'
+COLUMNS_KEY = b'erustudio.columns'
+
+
+def default_cache_dir():
+    """Per-user cache folder: %LOCALAPPDATA%\\EruStudio\\sheet_cache on Windows, ~/.cache/erustudio/sheet_cache elsewhere"""
+    if os.environ.get('LOCALAPPDATA'):
+        return os.path.join(os.environ['LOCALAPPDATA'], 'EruStudio', 'sheet_cache')
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'erustudio', 'sheet_cache')
+
+
+class SheetCache:
+    """Parsed sheets stored as one Feather file each, evicted least recently used first.
+
+    An entry is keyed by the workbook's absolute path, size and modification
+    time, the header row and the sheet name, so editing or replacing the
+    workbook makes its old entries unreachable; they age out like any other.
+    Pass the fingerprint of the WorkbookSession the rows were read from, so
+    rows read before the workbook was saved again are never filed under the
+    new version; without one the file's current size and time are used.
+    Reading an entry marks it as recently used. The folder is trimmed to
+    max_bytes after every store. Cache failures never fail a sync: a sheet that
+    cannot be stored or read is simply parsed again.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def entry_path(self, workbook_path, sheet_name, header_row, fingerprint=None):
+        if fingerprint is None:
+            stat = os.stat(workbook_path)
+            fingerprint = (stat.st_size, stat.st_mtime_ns)
+        key = json.dumps([CACHE_VERSION, os.path.abspath(workbook_path), *fingerprint, header_row, sheet_name])
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + CACHE_EXTENSION)
+
+    def contains(self, workbook_path, sheet_name, header_row, fingerprint=None):
+        return os.path.exists(self.entry_path(workbook_path, sheet_name, header_row, fingerprint))
+
+    def load(self, workbook_path, sheet_name, header_row, fingerprint=None):
+        """The cached DataFrame of a sheet, or None when it is not cached"""
+        from pyarrow import feather, ArrowException
+        path = self.entry_path(workbook_path, sheet_name, header_row, fingerprint)
+        try:
+            table = feather.read_table(path, memory_map=True)
+            # Feather column names are strings; the sheet's own header, numbers and all, is kept in the metadata
+            columns = json.loads(table.schema.metadata[COLUMNS_KEY])
+            os.utime(path)
+        except (OSError, ArrowException, KeyError, TypeError, ValueError):
+            # Unreadable, or written by something else: a miss, and the sheet is parsed and stored again
+            return None
+        frame = table.to_pandas()
+        frame.columns = columns
+        return frame
+
+    def store(self, workbook_path, sheet_name, header_row, frame, fingerprint=None):
+        """Write a sheet's DataFrame to the cache; returns False when it could not be stored"""
+        import pyarrow as pa
+        from pyarrow import feather
+        path = self.entry_path(workbook_path, sheet_name, header_row, fingerprint)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            columns = json.dumps(list(frame.columns))
+            table = pa.Table.from_pandas(frame.set_axis([str(column) for column in frame.columns], axis=1),
+                                         preserve_index=False)
+            table = table.replace_schema_metadata({**table.schema.metadata, COLUMNS_KEY: columns})
+            os.makedirs(self.directory, exist_ok=True)
+            feather.write_feather(table, temp_path)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError, pa.ArrowException):
+            # Headers that are dates, values Arrow cannot hold, a full disk: parse this sheet again next time
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        """[(path, size, last_used)] of every cached sheet"""
+        try:
+            scanned = list(os.scandir(self.directory))
+        except OSError:
+            return []
+        entries = []
+        for entry in scanned:
+            if entry.name.endswith(CACHE_EXTENSION):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def default_cache():
+    """The shared sheet cache, or None when pyarrow is missing or ERUSTUDIO_SHEET_CACHE=0.
+
+    ERUSTUDIO_SHEET_CACHE_MB overrides the size cap.
+    """
+    from engine.workbook_session import arrow_available
+    if os.environ.get('ERUSTUDIO_SHEET_CACHE') == '0' or not arrow_available():
+        return None
+    max_mb = os.environ.get('ERUSTUDIO_SHEET_CACHE_MB')
+    return SheetCache(max_bytes=int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES)
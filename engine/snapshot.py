@@ -0,0 +1,148 @@
+"""
+Snapshot backups for EruStudio
+Back up files before they are renamed without copying their data where the file system allows it.
+"""
+
+import ctypes
+import errno
+import os
+import shutil
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl request that makes the destination share the source's extents (Linux: Btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+STRATEGY_REFLINK = 'reflink'
+STRATEGY_HARDLINK = 'hardlink'
+STRATEGY_COPY = 'copy'
+
+STRATEGY_LABELS = {
+    STRATEGY_REFLINK: 'reflinks',
+    STRATEGY_HARDLINK: 'hard links',
+    STRATEGY_COPY: 'full copies',
+}
+
+# Failures that mean the file system (not this particular file) cannot do a strategy
+UNSUPPORTED_ERRNOS = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EPERM, errno.EMLINK}
+if hasattr(errno, 'ENOTSUP'):
+    UNSUPPORTED_ERRNOS.add(errno.ENOTSUP)
+
+
+def reflink(src, dst):
+    """Create dst as a copy-on-write clone of src, or raise OSError"""
+    if sys.platform == 'darwin':
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), src)
+    elif fcntl is not None and sys.platform.startswith('linux'):
+        with open(src, 'rb') as fsrc:
+            # O_EXCL: never truncate an existing dst, which may be a hard link to src itself
+            fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            try:
+                fcntl.ioctl(fd, FICLONE, fsrc.fileno())
+            except OSError:
+                os.close(fd)
+                os.remove(dst)
+                raise
+            os.close(fd)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform", src)
+    shutil.copystat(src, dst)
+
+
+class Snapshotter:
+    """Backs up files with the cheapest strategy that works: reflink, then hard link, then copy.
+
+    A reflink is an independent copy that shares data blocks until either side
+    changes. A hard link is another name for the same file; that is enough here
+    because renaming never changes file contents. Once a strategy fails because
+    the file system does not support it, it is not tried again.
+
+    copy_file has the signature of shutil.copy2, so it also works as the
+    copy_function of shutil.copytree. An existing dst is replaced, never
+    written through. strategies limits the ones tried, in order; copy is
+    always the last resort. copy_file may be called from several threads at
+    once.
+    """
+
+    def __init__(self, strategies=(STRATEGY_REFLINK, STRATEGY_HARDLINK, STRATEGY_COPY)):
+        self.available = [strategy for strategy in strategies if strategy != STRATEGY_COPY] + [STRATEGY_COPY]
+        self.counts = {strategy: 0 for strategy in self.available}
+        self.bytes_total = 0
+        self.bytes_avoided = 0
+        self._lock = threading.Lock()
+
+    def copy_file(self, src, dst):
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        if not os.path.lexists(dst):
+            return self._copy_new(src, dst)
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+        # dst may be a hard link to another file: build the copy beside it and swap it in instead of writing through it
+        temp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self._copy_new(src, temp)
+            os.replace(temp, dst)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        return dst
+
+    def _copy_new(self, src, dst):
+        """copy_file for a dst that does not exist yet"""
+        size = os.path.getsize(src)
+        for strategy in list(self.available):
+            try:
+                if strategy == STRATEGY_REFLINK:
+                    reflink(src, dst)
+                elif strategy == STRATEGY_HARDLINK:
+                    os.link(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+            except OSError as e:
+                if strategy == STRATEGY_COPY:
+                    raise
+                if e.errno in UNSUPPORTED_ERRNOS:
+                    with self._lock:
+                        if strategy in self.available:
+                            self.available.remove(strategy)
+                continue
+            with self._lock:
+                self.counts[strategy] += 1
+                self.bytes_total += size
+                if strategy != STRATEGY_COPY:
+                    self.bytes_avoided += size
+            return dst
+
+    def snapshot(self, source_path, backup_folder):
+        """Back up one file or directory tree from source_path into backup_folder"""
+        dest_path = os.path.join(backup_folder, os.path.basename(source_path))
+        if os.path.isdir(source_path):
+            shutil.copytree(source_path, dest_path, copy_function=self.copy_file, dirs_exist_ok=True)
+        else:
+            self.copy_file(source_path, dest_path)
+        return dest_path
+
+    def strategy_used(self):
+        """The strategy that handled most files, or None before anything was backed up"""
+        if not any(self.counts.values()):
+            return None
+        return max(self.counts, key=self.counts.get)
+
+    def describe(self):
+        """One-line summary such as '120 files backed up (120 via hard links), 3481.6 MB not copied'"""
+        files = sum(self.counts.values())
+        parts = [f"{count} via {STRATEGY_LABELS[strategy]}" for strategy, count in self.counts.items() if count]
+        return f"{files} files backed up ({', '.join(parts) or 'nothing to back up'}), " \
+               f"{self.bytes_avoided / 1024 / 1024:.1f} MB not copied"
@@ -0,0 +1,331 @@
+"""
+Workbook sessions for EruStudio
+Open an xlsx archive once, keep its shared strings and date styles, and parse sheets serially or in a process pool.
+"""
+
+import os
+import posixpath
+import zipfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import iterparse, fromstring
+
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# Set in each pool worker by _init_worker, so the shared strings are pickled once per process, not once per sheet
+_worker_session = None
+
+
+def _local(tag):
+    """Tag name without its namespace; strict and transitional OOXML use different ones"""
+    return tag.rpartition('}')[2]
+
+
+def _column_index(reference):
+    """0-based column of a cell reference such as 'BC12'"""
+    index = 0
+    for char in reference:
+        if char.isdigit():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def clean_header(values):
+    """Name header cells the way pandas does: blanks become 'Unnamed: i', repeats get '.1', '.2', ..."""
+    values = list(values)
+    # Trailing blank cells are padding, not columns
+    while values and values[-1] is None:
+        values.pop()
+    header, seen = [], {}
+    for i, value in enumerate(values):
+        name = f"Unnamed: {i}" if value is None or (isinstance(value, str) and not value.strip()) else value
+        if name in seen:
+            seen[name] += 1
+            while f"{name}.{seen[name]}" in seen:
+                seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        header.append(name)
+    return header
+
+
+def arrow_available():
+    """True when pyarrow is installed, so frames can use Arrow-backed columns"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class WorkbookSession:
+    """An open xlsx workbook.
+
+    The archive, the sheet list, the shared-strings table and the date styles
+    are read once when the session opens; every sheet parse after that reuses
+    them. Use it as a context manager, or call close().
+    """
+
+    def __init__(self, path, shared_strings=None, date_styles=None, timedelta_styles=None, epoch=None, sheet_parts=None):
+        from openpyxl.utils.datetime import CALENDAR_WINDOWS_1900
+        self.path = path
+        self.archive = zipfile.ZipFile(path)
+        # (size, mtime_ns) of the file this handle reads, which may since have been saved over
+        opened = os.fstat(self.archive.fp.fileno())
+        self.fingerprint = (opened.st_size, opened.st_mtime_ns)
+        if sheet_parts is None:
+            # Full open: read the workbook structure; pool workers receive it ready-made instead
+            workbook_part = self._workbook_part()
+            rels = self._relationships(workbook_part)
+            root = fromstring(self.archive.read(workbook_part))
+            sheet_parts, epoch = {}, CALENDAR_WINDOWS_1900
+            for elem in root.iter():
+                tag = _local(elem.tag)
+                if tag == 'sheet':
+                    target = rels.get(elem.get(f'{{{REL_NS}}}id') or elem.get('id'))
+                    if target:
+                        sheet_parts[elem.get('name')] = target[1]
+                elif tag == 'workbookPr' and elem.get('date1904') in ('1', 'true'):
+                    from openpyxl.utils.datetime import CALENDAR_MAC_1904
+                    epoch = CALENDAR_MAC_1904
+            targets = {rel_type.rpartition('/')[2]: target for rel_type, target in rels.values()}
+            shared_strings = self._read_shared_strings(targets.get('sharedStrings'))
+            date_styles, timedelta_styles = self._read_date_styles(targets.get('styles'))
+        self.sheet_parts = sheet_parts
+        self.shared_strings = shared_strings
+        self.date_styles = date_styles
+        self.timedelta_styles = timedelta_styles
+        self.epoch = epoch
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.archive.close()
+
+    @property
+    def sheet_names(self):
+        return list(self.sheet_parts)
+
+    def _workbook_part(self):
+        try:
+            root = fromstring(self.archive.read('_rels/.rels'))
+            for rel in root:
+                if rel.get('Type', '').endswith('/officeDocument'):
+                    return rel.get('Target').lstrip('/')
+        except KeyError:
+            pass
+        return 'xl/workbook.xml'
+
+    def _relationships(self, part):
+        """{id: (type, part path)} for the relationships of a part"""
+        folder, name = posixpath.split(part)
+        try:
+            root = fromstring(self.archive.read(posixpath.join(folder, '_rels', name + '.rels')))
+        except KeyError:
+            return {}
+        rels = {}
+        for rel in root:
+            target = rel.get('Target', '')
+            target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get('Id')] = (rel.get('Type', ''), target)
+        return rels
+
+    def _read_shared_strings(self, part):
+        if not part or part not in self.archive.namelist():
+            return []
+        strings = []
+        with self.archive.open(part) as f:
+            for _, elem in iterparse(f):
+                if _local(elem.tag) != 'si':
+                    continue
+                # Plain text is a direct <t>; rich text is a run of <r><t>; phonetic <rPh> runs are skipped
+                parts = []
+                for child in elem:
+                    tag = _local(child.tag)
+                    if tag == 't':
+                        parts.append(child.text or '')
+                    elif tag == 'r':
+                        parts.extend(t.text or '' for t in child if _local(t.tag) == 't')
+                strings.append(''.join(parts))
+                elem.clear()
+        return strings
+
+    def _read_date_styles(self, part):
+        """Indices of the cell formats that show numbers as dates or durations"""
+        from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+        if not part or part not in self.archive.namelist():
+            return frozenset(), frozenset()
+        root = fromstring(self.archive.read(part))
+        formats = dict(BUILTIN_FORMATS)
+        date_styles, timedelta_styles = set(), set()
+        for elem in root:
+            tag = _local(elem.tag)
+            if tag == 'numFmts':
+                for fmt in elem:
+                    formats[int(fmt.get('numFmtId'))] = fmt.get('formatCode', '')
+            elif tag == 'cellXfs':
+                for index, xf in enumerate(elem):
+                    code = formats.get(int(xf.get('numFmtId', 0)), '')
+                    if is_timedelta_format(code):
+                        timedelta_styles.add(index)
+                    elif is_date_format(code):
+                        date_styles.add(index)
+        return frozenset(date_styles), frozenset(timedelta_styles)
+
+    def row_count(self, sheet_name):
+        """Last row number from the sheet's <dimension> element, read without parsing any cells; None if absent"""
+        with self.archive.open(self.sheet_parts[sheet_name]) as f:
+            for _, elem in iterparse(f, events=('start',)):
+                tag = _local(elem.tag)
+                if tag == 'dimension':
+                    ref = elem.get('ref', '')
+                    if ':' not in ref:
+                        # Some writers leave a bare 'A1' however big the sheet is
+                        return None
+                    last_cell = ref.rpartition(':')[2]
+                    digits = ''.join(char for char in last_cell if char.isdigit())
+                    return int(digits) if digits else None
+                if tag == 'sheetData':
+                    return None
+        return None
+
+    def iter_rows(self, sheet_name, min_row=1, max_row=None):
+        """Yield the cell values of each row from min_row on (1-based) as tuples; missing rows are empty tuples"""
+        from openpyxl.utils.datetime import from_excel
+        shared_strings = self.shared_strings
+        date_styles, timedelta_styles = self.date_styles, self.timedelta_styles
+        expected_row = min_row
+
+        with self.archive.open(self.sheet_parts[sheet_name]) as f:
+            row_number = 0
+            for _, elem in iterparse(f):
+                if _local(elem.tag) != 'row':
+                    continue
+                row_number = int(elem.get('r') or row_number + 1)
+                if row_number < min_row:
+                    elem.clear()
+                    continue
+                if max_row is not None and row_number > max_row:
+                    break
+                while expected_row < row_number:
+                    yield ()
+                    expected_row += 1
+
+                values = []
+                for cell in elem:
+                    reference = cell.get('r')
+                    if reference:
+                        column = _column_index(reference)
+                        if column > len(values):
+                            values.extend([None] * (column - len(values)))
+                    cell_type = cell.get('t', 'n')
+                    text = None
+                    for child in cell:
+                        tag = _local(child.tag)
+                        if tag == 'v':
+                            text = child.text
+                        elif tag == 'is':
+                            text = ''.join(t.text or '' for t in child.iter() if _local(t.tag) == 't')
+
+                    if text is None or cell_type == 'e':
+                        value = None
+                    elif cell_type == 's':
+                        value = shared_strings[int(text)]
+                    elif cell_type in ('str', 'inlineStr'):
+                        value = text
+                    elif cell_type == 'b':
+                        value = text == '1'
+                    elif cell_type == 'd':
+                        value = datetime.fromisoformat(text.rstrip('Z'))
+                    else:
+                        try:
+                            value = int(text)
+                        except ValueError:
+                            value = float(text)
+                        style = int(cell.get('s', 0))
+                        if style in date_styles:
+                            value = from_excel(value, self.epoch)
+                        elif style in timedelta_styles:
+                            value = from_excel(value, self.epoch, timedelta=True)
+                    values.append(value)
+
+                elem.clear()
+                yield tuple(values)
+                expected_row = row_number + 1
+
+    def read_header(self, sheet_name, header_row=1):
+        """Cleaned header of a sheet; header_row is 1-based"""
+        return clean_header(next(self.iter_rows(sheet_name, header_row, header_row), ()))
+
+    def read_sheet(self, sheet_name, header_row=1, arrow=False, align=None):
+        """Parse a whole sheet into a DataFrame with NumPy dtypes, or Arrow dtypes when arrow is set.
+
+        Rows above header_row are skipped and completely empty rows are dropped.
+        With align, the frame is passed through align(frame, sheet_name) instead,
+        which decides the columns and dtypes itself.
+        """
+        import pandas as pd
+        rows = self.iter_rows(sheet_name, header_row)
+        header = clean_header(next(rows, ()))
+        width = len(header)
+        records = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            if len(row) != width:
+                row = tuple(row[:width]) + (None,) * (width - len(row))
+            records.append(row)
+        if align is not None:
+            # Raw cell values, so align sees integers with gaps as integers rather than floats
+            return align(pd.DataFrame(records, columns=header, dtype=object), sheet_name)
+        df = pd.DataFrame.from_records(records, columns=header).infer_objects()
+        if arrow:
+            df = df.convert_dtypes(dtype_backend='pyarrow')
+        return df
+
+    def iter_frames(self, sheet_names, header_row=1, max_workers=None, arrow=None, align=None):
+        """Parse sheets in a process pool and yield (sheet_name, DataFrame) in the order given.
+
+        Every worker opens the archive once and gets the shared strings and
+        styles of this session instead of parsing them again. At most
+        max_workers sheets are parsed or waiting to be consumed at a time,
+        which bounds memory to that many sheets. arrow defaults to whether
+        pyarrow is installed. align is applied inside the workers (see
+        read_sheet), so it must be picklable.
+        """
+        arrow = arrow_available() if arrow is None else arrow
+        sheet_names = list(sheet_names)
+        max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(sheet_names) or 1))
+        if max_workers == 1:
+            for sheet_name in sheet_names:
+                yield sheet_name, self.read_sheet(sheet_name, header_row, arrow, align)
+            return
+
+        init_args = (self.path, self.shared_strings, self.date_styles, self.timedelta_styles, self.epoch, self.sheet_parts)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=init_args) as executor:
+            pending = list(sheet_names)
+            futures = []
+            try:
+                while pending or futures:
+                    while pending and len(futures) < max_workers:
+                        sheet_name = pending.pop(0)
+                        futures.append((sheet_name, executor.submit(_read_sheet_worker, sheet_name, header_row, arrow, align)))
+                    sheet_name, future = futures.pop(0)
+                    yield sheet_name, future.result()
+            finally:
+                for _, future in futures:
+                    future.cancel()
+
+
+def _init_worker(*session_args):
+    global _worker_session
+    _worker_session = WorkbookSession(*session_args)
+
+
+def _read_sheet_worker(sheet_name, header_row, arrow, align):
+    return _worker_session.read_sheet(sheet_name, header_row, arrow, align)
@@ -0,0 +1,461 @@
+"""
+Worksheet Sync engine for EruStudio
+Merge several worksheets of one workbook into a single table, streamed chunk by chunk.
+"""
+
+import os
+import re
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from engine.exporters import open_exporter
+from engine.workbook_session import WorkbookSession, arrow_available, clean_header
+
+SOURCE_COLUMN = 'Source Worksheet'
+SYNCED_SHEET_NAME = 'Synced_Data'
+
+# Rows per chunk; memory use is bounded by this, not by the size of the workbook
+DEFAULT_CHUNK_ROWS = 20000
+PREVIEW_ROWS = 1000
+
+# Rows of whole sheets held in memory at once when sheets are parsed whole, in the pool or to fill the cache;
+# sheets bigger than this, or that do not record their size, are streamed row by row instead
+WHOLE_SHEET_ROW_BUDGET = 500000
+
+# Rows per sheet sampled to infer column types before anything is read in full
+SCHEMA_SAMPLE_ROWS = 1000
+# Text columns whose sample has at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_RATIO = 0.2
+CATEGORY_MIN_VALUES = 20
+
+# Formats openpyxl can stream in read-only mode; anything else is read one sheet at a time by pandas
+STREAMABLE_EXTENSIONS = ('.xlsx', '.xlsm', '.xltx', '.xltm')
+
+
+def _is_streamable(workbook_path):
+    return os.path.splitext(workbook_path)[1].lower() in STREAMABLE_EXTENSIONS
+
+
+def open_session(workbook_path):
+    """A WorkbookSession for xlsx files, or None for formats pandas has to read whole"""
+    return WorkbookSession(workbook_path) if _is_streamable(workbook_path) else None
+
+
+def list_worksheets(workbook_path, session=None):
+    """Return the sheet names of a workbook"""
+    if session is not None:
+        return session.sheet_names
+    if _is_streamable(workbook_path):
+        with WorkbookSession(workbook_path) as session:
+            return session.sheet_names
+    import pandas as pd
+    return pd.ExcelFile(workbook_path).sheet_names
+
+
+def _iter_raw_sheets(workbook_path, worksheet_names, header_row, session=None):
+    """Yield (sheet_name, header, row_iterator) for each sheet, keeping one sheet open at a time"""
+    if session is None and _is_streamable(workbook_path):
+        with WorkbookSession(workbook_path) as session:
+            yield from _iter_raw_sheets(workbook_path, worksheet_names, header_row, session)
+        return
+    if session is not None:
+        for ws_name in worksheet_names:
+            rows = session.iter_rows(ws_name, header_row)
+            yield ws_name, clean_header(next(rows, ())), rows
+    else:
+        import pandas as pd
+        for ws_name in worksheet_names:
+            df = pd.read_excel(workbook_path, sheet_name=ws_name, header=header_row - 1)
+            df = df.astype(object).where(df.notna(), None)
+            yield ws_name, list(df.columns), df.itertuples(index=False, name=None)
+
+
+def normalize_header(name):
+    """Merge key for headers that differ only in case, spacing, '_' or '-': ' First_Name' and 'first name' match"""
+    if not isinstance(name, str):
+        return name
+    return ' '.join(re.sub(r'[_\-]+', ' ', name).split()).casefold()
+
+
+def _value_kind(value):
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'integer'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, (datetime, date)):
+        return 'datetime'
+    if isinstance(value, timedelta):
+        return 'timedelta'
+    return 'text'
+
+
+def _text_dtype():
+    """Arrow-backed strings when pyarrow is installed; pandas strings otherwise. Never object."""
+    return 'string[pyarrow]' if arrow_available() else 'string'
+
+
+def _text_value(value):
+    # A whole number in a typed float column was an integer cell; pandas Timedeltas print unlike timedelta
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, timedelta) and hasattr(value, 'to_pytimedelta'):
+        value = value.to_pytimedelta()
+    return str(value)
+
+
+def _as_text(series):
+    """A column as text, missing values kept.
+
+    Raw cell values and the same values typed for the sheet cache give the
+    same strings, so a sync reads the same whether its sheets came from the
+    workbook or from the cache.
+    """
+    values = series.astype(object)
+    return values.where(values.notna(), None).map(_text_value, na_action='ignore').astype(_text_dtype())
+
+
+# Dtypes a column falls back to, in order, when a value does not fit the sampled type
+_WIDER_DTYPES = {'Int64': 'float64', 'float64': 'text', 'boolean': 'text', 'datetime64[ns]': 'text',
+                 'timedelta64[ns]': 'text', 'category': 'text'}
+
+
+def infer_dtype(values, categories=True):
+    """Pick a compact dtype for a column from its sampled non-empty values"""
+    kinds = {_value_kind(value) for value in values}
+    if kinds == {'integer'}:
+        return 'Int64'
+    if kinds and kinds <= {'integer', 'float'}:
+        return 'float64'
+    if kinds == {'boolean'}:
+        return 'boolean'
+    if kinds == {'datetime'}:
+        return 'datetime64[ns]'
+    if kinds == {'timedelta'}:
+        return 'timedelta64[ns]'
+    if categories and len(values) >= CATEGORY_MIN_VALUES and len(set(map(str, values))) <= len(values) * CATEGORY_MAX_RATIO:
+        return 'category'
+    return _text_dtype()
+
+
+class SchemaWidened(Exception):
+    """Values of a chunk did not fit their columns' sampled dtypes; dtypes maps each such column to the one it needs.
+
+    Every column of the chunk is checked, so all of them are widened at once.
+    Chunks already written used the old dtypes, so whoever consumes the
+    chunks widens the schema and starts over (see stream_sync). Picklable, so
+    it also reaches the caller from pool workers.
+    """
+
+    def __init__(self, dtypes):
+        super().__init__(dtypes)
+        self.dtypes = dtypes
+
+    def __str__(self):
+        return '; '.join(f"Column '{column}' needs {dtype} values" for column, dtype in self.dtypes.items())
+
+
+class SyncSchema:
+    """The unified columns and dtypes of a sync, resolved before any data is read.
+
+    columns lists 'Source Worksheet' first, then every distinct normalized
+    header in first-seen order. sheet_columns maps each sheet's own header to
+    its unified column, and dtypes holds one dtype per column. Instances are
+    picklable, so align can run inside pool workers. align never changes the
+    dtypes: values that do not fit raise SchemaWidened, once for the whole frame.
+    """
+
+    def __init__(self, sheet_names, columns, sheet_columns, dtypes):
+        self.sheet_names = list(sheet_names)
+        self.columns = columns
+        self.sheet_columns = sheet_columns
+        self.dtypes = dtypes
+
+    def align(self, frame, sheet_name):
+        """Rename, reorder and cast a frame read from sheet_name to the unified schema, one cast per column"""
+        import pandas as pd
+        frame = frame.rename(columns=self.sheet_columns[sheet_name])
+        aligned, widened = {}, {}
+        for column in self.columns:
+            if column == SOURCE_COLUMN:
+                aligned[column] = pd.Categorical([sheet_name] * len(frame), categories=self.sheet_names)
+            elif column in frame:
+                cast = self._cast(frame[column], column)
+                if isinstance(cast, str):
+                    widened[column] = cast
+                else:
+                    aligned[column] = cast
+            else:
+                aligned[column] = pd.Series(None, index=frame.index, dtype=self._dtype(column))
+        if widened:
+            raise SchemaWidened(widened)
+        return pd.DataFrame(aligned, index=frame.index)
+
+    def _dtype(self, column):
+        dtype = self.dtypes[column]
+        return _text_dtype() if dtype == 'text' else dtype
+
+    def _cast(self, series, column):
+        """The series cast to the column's dtype, or the name of the wider dtype it needs"""
+        dtype = self.dtypes[column]
+        if dtype in ('text', _text_dtype()):
+            return _as_text(series)
+        try:
+            return series.astype(dtype)
+        except (ValueError, TypeError, OverflowError):
+            pass
+        # The sample missed a value of another type: report the narrowest dtype that holds this chunk too
+        while dtype != 'text':
+            dtype = _WIDER_DTYPES.get(dtype, 'text')
+            try:
+                if dtype != 'text':
+                    series.astype(dtype)
+                break
+            except (ValueError, TypeError, OverflowError):
+                continue
+        return dtype
+
+    def widen(self, dtypes):
+        """Use the dtypes of a SchemaWidened from now on; the sync has to start over with them"""
+        self.dtypes.update(dtypes)
+
+
+def type_sheet(frame, sheet_name):
+    """Cast a whole sheet of raw values column by column to the dtypes its own values call for.
+
+    This is how sheets are stored in the sheet cache: typed from every value
+    rather than a sample, and without categoricals, so the cached copy reads
+    back as the same values the workbook holds.
+    """
+    import pandas as pd
+    typed = {}
+    for column in frame.columns:
+        values = frame[column]
+        dtype = infer_dtype(values.dropna().tolist(), categories=False)
+        try:
+            typed[column] = values.astype(dtype)
+        except (ValueError, TypeError, OverflowError):
+            typed[column] = _as_text(values)
+    return pd.DataFrame(typed, index=frame.index, columns=frame.columns)
+
+
+def resolve_schema(workbook_path, worksheet_names, header_row=1, session=None, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """Read only the header row and the first sample_rows rows of each sheet and build the SyncSchema.
+
+    The sample always comes from the workbook, even for sheets in the sheet
+    cache, whose typed columns no longer tell integer cells from whole
+    floats; cached and uncached runs get the same schema.
+    """
+    columns = {SOURCE_COLUMN: SOURCE_COLUMN}
+    samples = {}
+    sheet_columns = {}
+    for ws_name, header, rows in _iter_raw_sheets(workbook_path, worksheet_names, header_row, session):
+        mapping, used = {}, {}
+        for original in header:
+            key, name = normalize_header(original), original
+            if key in used:
+                # Two headers of the same sheet normalize alike; keep them apart like pandas does
+                used[key] += 1
+                key, name = f"{key}.{used[key]}", f"{name}.{used[key]}"
+            used.setdefault(key, 0)
+            if key not in columns:
+                columns[key] = ' '.join(name.split()) if isinstance(name, str) else name
+            mapping[original] = columns[key]
+        sheet_columns[ws_name] = mapping
+
+        original = list(mapping)
+        for row in islice(rows, sample_rows):
+            for name, value in zip(original, row):
+                if value is not None:
+                    samples.setdefault(mapping[name], []).append(value)
+
+    unified = list(columns.values())
+    dtypes = {column: infer_dtype(samples.get(column, [])) for column in unified if column != SOURCE_COLUMN}
+    dtypes[SOURCE_COLUMN] = 'category'
+    return SyncSchema(worksheet_names, unified, sheet_columns, dtypes)
+
+
+def _plan_whole_sheets(session, worksheet_names, header_row, max_workers, row_budget):
+    """(sheets to parse whole, worker count) such that the whole sheets held at once stay within row_budget rows"""
+    sizes = {}
+    for ws_name in worksheet_names:
+        last_row = session.row_count(ws_name)
+        if last_row is not None and last_row - header_row <= row_budget:
+            sizes[ws_name] = max(1, last_row - header_row)
+    if not sizes:
+        return set(), 1
+    # Each worker holds one sheet, and one more is being written out
+    workers = max(1, min(max_workers, row_budget // max(sizes.values()) - 1))
+    return set(sizes), workers
+
+
+def iter_sync_chunks(workbook_path, worksheet_names, header_row=1, chunk_rows=DEFAULT_CHUNK_ROWS, schema=None,
+                     max_rows=None, session=None, max_workers=1, cache=None, row_budget=WHOLE_SHEET_ROW_BUDGET):
+    """Yield the synced table as DataFrames of at most chunk_rows rows.
+
+    Every chunk follows the same SyncSchema (resolved here unless given):
+    'Source Worksheet' first, then the unified headers, each with its compact
+    dtype. header_row is 1-based, as shown in the UI. Completely empty rows
+    are skipped. Stops after max_rows rows when given. A value the schema's
+    sample did not foresee raises SchemaWidened; widen the schema and start
+    over, as preview_sync and stream_sync do.
+
+    With max_workers 1 sheets are streamed row by row and only one chunk is held
+    in memory. With more (None uses every CPU), whole sheets are parsed and cast
+    in a process pool (xlsx only).
+
+    With a SheetCache, sheets already in it are read from it, and the others
+    are parsed whole, whatever max_workers is, and stored in it. Only a
+    preview (max_rows given) streams uncached sheets and leaves them uncached.
+
+    Whole sheets are only parsed while the rows held at once stay within
+    row_budget: bigger sheets, and sheets that do not record their size, are
+    streamed (and not cached), and the pool gets fewer workers when the
+    sheets are large. Memory stays bounded whatever the size of the workbook.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    if session is None and _is_streamable(workbook_path):
+        with WorkbookSession(workbook_path) as session:
+            yield from iter_sync_chunks(workbook_path, worksheet_names, header_row, chunk_rows, schema,
+                                        max_rows, session, max_workers, cache, row_budget)
+        return
+    if session is None:
+        cache = None
+    if schema is None:
+        schema = resolve_schema(workbook_path, worksheet_names, header_row, session)
+    rows_left = max_rows if max_rows is not None else -1
+
+    whole_sheets = set()
+    if session is not None and ((cache is not None and max_rows is None)
+                                or (max_workers != 1 and len(worksheet_names) > 1)):
+        whole_sheets, max_workers = _plan_whole_sheets(session, worksheet_names, header_row, max_workers, row_budget)
+    for chunk in _iter_sheet_chunks(workbook_path, worksheet_names, header_row, chunk_rows, schema, session,
+                                    max_workers, cache, whole_sheets):
+        if len(chunk) > rows_left > 0:
+            chunk = chunk.iloc[:rows_left]
+        yield chunk
+        rows_left -= len(chunk)
+        if rows_left == 0:
+            return
+
+
+def _iter_sheet_chunks(workbook_path, worksheet_names, header_row, chunk_rows, schema, session, max_workers, cache,
+                       whole_sheets):
+    import pandas as pd
+    cached = {ws_name for ws_name in worksheet_names
+              if cache is not None and cache.contains(workbook_path, ws_name, header_row, session.fingerprint)}
+    to_parse = [ws_name for ws_name in worksheet_names if ws_name not in cached and ws_name in whole_sheets]
+    to_stream = [ws_name for ws_name in worksheet_names if ws_name not in cached and ws_name not in whole_sheets]
+    if to_parse:
+        # Cast in the workers; sheets headed for the cache are typed on their own and aligned here
+        frames = session.iter_frames(to_parse, header_row, max_workers, arrow=False,
+                                     align=type_sheet if cache is not None else schema.align)
+    raw_sheets = _iter_raw_sheets(workbook_path, to_stream, header_row, session)
+
+    for ws_name in worksheet_names:
+        if ws_name in cached or ws_name in whole_sheets:
+            frame = cache.load(workbook_path, ws_name, header_row, session.fingerprint) if ws_name in cached else None
+            if frame is None:
+                if ws_name in cached:
+                    # Evicted since it was found; parse it here
+                    frame = session.read_sheet(ws_name, header_row, align=type_sheet)
+                else:
+                    frame = next(frames)[1]
+                if cache is not None:
+                    cache.store(workbook_path, ws_name, header_row, frame, session.fingerprint)
+            if cache is not None:
+                frame = schema.align(frame, ws_name)
+            for start in range(0, len(frame), chunk_rows):
+                yield frame.iloc[start:start + chunk_rows]
+            continue
+
+        _, header, rows = next(raw_sheets)
+        width = len(header)
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            if len(row) != width:
+                row = tuple(row[:width]) + (None,) * (width - len(row))
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield schema.align(pd.DataFrame(chunk, columns=header, dtype=object), ws_name)
+                chunk = []
+        if chunk:
+            yield schema.align(pd.DataFrame(chunk, columns=header, dtype=object), ws_name)
+
+
+def estimate_rows(workbook_path, worksheet_names, header_row=1, session=None):
+    """Upper bound on the synced data rows from the sheet dimensions, or None when a sheet does not record one"""
+    if session is None:
+        return None
+    total = 0
+    for ws_name in worksheet_names:
+        last_row = session.row_count(ws_name)
+        if last_row is None:
+            return None
+        total += max(0, last_row - header_row)
+    return total
+
+
+def preview_sync(workbook_path, worksheet_names, header_row=1, max_rows=PREVIEW_ROWS, session=None, cache=None):
+    """Return the first max_rows rows of the synced table as one DataFrame, or None when it is empty"""
+    import pandas as pd
+    if session is None and _is_streamable(workbook_path):
+        with WorkbookSession(workbook_path) as session:
+            return preview_sync(workbook_path, worksheet_names, header_row, max_rows, session, cache)
+    schema = resolve_schema(workbook_path, worksheet_names, header_row, session)
+    while True:
+        try:
+            chunks = list(iter_sync_chunks(workbook_path, worksheet_names, header_row, schema=schema,
+                                           max_rows=max_rows, session=session, cache=cache))
+            break
+        except SchemaWidened as e:
+            schema.widen(e.dtypes)
+    if not chunks:
+        return None
+    df = pd.concat(chunks, ignore_index=True)
+    # Chunks from different sheets carry different categories, which concat turns into object
+    for column, dtype in chunks[0].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def stream_sync(workbook_path, worksheet_names, output_path, header_row=1, chunk_rows=DEFAULT_CHUNK_ROWS,
+                on_progress=None, session=None, max_workers=1, compression=None, cache=None):
+    """Stream the synced table into a file without holding it in memory.
+
+    The format follows output_path's extension (see engine.exporters.EXPORTERS);
+    compression is passed to the exporter. Each chunk is written as soon as it is
+    read; max_workers and cache are passed on to iter_sync_chunks. A failed export leaves
+    no partial file behind. When a value does not fit its column's sampled
+    dtype, the column is widened and the export starts over, so every chunk
+    of the file has the same final schema.
+    on_progress(sheet_name, rows_written) is called after each chunk.
+    Returns {'rows', 'columns', 'sheets'}.
+    """
+    if session is None and _is_streamable(workbook_path):
+        with WorkbookSession(workbook_path) as session:
+            return stream_sync(workbook_path, worksheet_names, output_path, header_row, chunk_rows,
+                               on_progress, session, max_workers, compression, cache)
+    schema = resolve_schema(workbook_path, worksheet_names, header_row, session)
+    while True:
+        exporter = open_exporter(output_path, schema.columns, compression, SYNCED_SHEET_NAME)
+        try:
+            for chunk in iter_sync_chunks(workbook_path, worksheet_names, header_row, chunk_rows, schema,
+                                          session=session, max_workers=max_workers, cache=cache):
+                exporter.write(chunk)
+                if on_progress:
+                    on_progress(chunk.iat[0, 0], exporter.rows)
+            exporter.close()
+            break
+        except SchemaWidened as e:
+            # Sheets parsed so far are in the cache by now, so starting over mostly re-reads them from there
+            exporter.abort()
+            schema.widen(e.dtypes)
+        except BaseException:
+            exporter.abort()
+            raise
+    return {'rows': exporter.rows, 'columns': len(schema.columns), 'sheets': exporter.sheets}
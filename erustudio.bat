@@ -0,0 +1,3 @@
+@echo off
+REM EruStudio command line: erustudio rename^|zip^|mkdirs^|sync ...
+python "%~dp0erustudio.py" %*
@@ -0,0 +1,14 @@
+"""
+EruStudio command line launcher
+Runs the batch operations without the desktop UI; see `python erustudio.py --help`.
+"""
+
+import multiprocessing
+import sys
+
+from engine.cli import main
+
+if __name__ == "__main__":
+    # Required for the Multi-Zip process pool when running as a frozen executable
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,11 +1,24 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import os
 import sys
-from modules.worksheet_sync import WorksheetSyncModule
-from modules.bulk_rename import BulkRenameModule
-from modules.multi_zip import MultiZipModule
-from modules.folder_creator import FolderCreatorModule
+import importlib
+import multiprocessing
+import threading
+
+# Module windows are imported when their card is first clicked, so the dashboard never waits for pandas
+MODULES = {
+    "Worksheet Sync": ("modules.worksheet_sync", "WorksheetSyncModule"),
+    "Bulk Rename": ("modules.bulk_rename", "BulkRenameModule"),
+    "Multi-Zip": ("modules.multi_zip", "MultiZipModule"),
+    "Folder Creator": ("modules.folder_creator", "FolderCreatorModule"),
+}
+
+# Imported in the background once the dashboard is shown; set ERUSTUDIO_WARMUP=0 to skip
+WARMUP_IMPORTS = ("pandas", "openpyxl") + tuple(module_name for module_name, _ in MODULES.values())
 
 class ModernButton(tk.Button):
     """Custom modern button with hover effects"""
@@ -190,7 +203,16 @@ class EruStudioApp:
 
         return card_frame
 
-    def open_module(self, module_class, title):
+    def load_module_class(self, title):
+        """Import a module window class on first use"""
+        module_name, class_name = MODULES[title]
+        if module_name not in sys.modules:
+            self.status_var.set(f"Loading {title}...")
+            self.root.update_idletasks()
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def open_module(self, title):
+        module_class = self.load_module_class(title)
         if self.current_module:
             self.current_module.destroy()
 
@@ -216,10 +238,18 @@ class EruStudioApp:
 
         module_window.protocol("WM_DELETE_WINDOW", lambda: (self.status_var.set("Ready"), setattr(self, 'current_module', None), module_window.destroy()))
 
-    def open_worksheet_sync(self): self.open_module(WorksheetSyncModule, "Worksheet Sync")
-    def open_bulk_rename(self): self.open_module(BulkRenameModule, "Bulk Rename")
-    def open_multi_zip(self): self.open_module(MultiZipModule, "Multi-Zip")
-    def open_folder_creator(self): self.open_module(FolderCreatorModule, "Folder Creator")
+    def open_worksheet_sync(self): self.open_module("Worksheet Sync")
+    def open_bulk_rename(self): self.open_module("Bulk Rename")
+    def open_multi_zip(self): self.open_module("Multi-Zip")
+    def open_folder_creator(self): self.open_module("Folder Creator")
+
+    def report_startup(self):
+        """Show how long the dashboard took to appear, then warm up the heavy imports"""
+        self.startup_seconds = time.perf_counter() - STARTUP_STARTED
+        if not self.current_module:
+            self.status_var.set(f"Ready - started in {self.startup_seconds:.2f} s")
+        if os.environ.get('ERUSTUDIO_WARMUP', '1') != '0':
+            threading.Thread(target=warm_up_imports, daemon=True).start()
 
     def on_resize(self, event):
         width = self.root.winfo_width()
@@ -237,6 +267,14 @@ class EruStudioApp:
                 card.grid_forget(); card.grid(row=positions[i][0], column=positions[i][1], padx=10, pady=10, sticky='nsew')
             self.is_single_column = False
 
+def warm_up_imports():
+    """Import pandas, openpyxl and the module windows so the first card click opens instantly"""
+    for module_name in WARMUP_IMPORTS:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+
 def main():
     root = tk.Tk()
     app = EruStudioApp(root)
@@ -245,7 +283,11 @@ def main():
     y = (root.winfo_screenheight() // 2) - (root.winfo_height() // 2)
     root.geometry(f"+{x}+{y}")
     root.resizable(True, True)
+    # Runs once the first frame of the dashboard has been drawn
+    root.after_idle(app.report_startup)
     root.mainloop()
 
 if __name__ == "__main__":
+    # Required for the Multi-Zip process pool when running as a frozen executable
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -1,12 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import glob
-import pandas as pd
 import os
-import shutil
+import queue
+import threading
 from pathlib import Path
 from typing import List, Dict
 
+from engine.bulk_rename import build_rename_mapping, apply_conflicts, execute_renames, find_conflicts, iter_rename_plan, STATUS_READY
+from engine.rename_journal import find_journals, STATE_COMMITTED, STATE_PENDING
+from engine.rename_rules import RenameRule, MODES, MODE_GLOB, CASES, CASE_KEEP
+from engine.search_index import SearchIndex
+from modules.virtual_table import VirtualTable, debounce_search
+
 # Import the template creation function
 
 class BulkRenameModule:
@@ -19,11 +25,14 @@ class BulkRenameModule:
         self.source_folder = None
         self.rename_mapping = {}
         self.preview_data = []
+        self.search_index = SearchIndex()
+        self.plan_queue = None
+        self.plan_cancel = None
         self.search_var = tk.StringVar()
 
         self.setup_styles()
         self.create_widgets()
-        self.search_var.trace_add("write", self.search_files)
+        debounce_search(self.parent, self.search_var, self.search_files)
 
     def setup_styles(self):
         """Configure custom styles for the module"""
@@ -92,7 +101,7 @@ class BulkRenameModule:
         config_card = ttk.Frame(main_frame, style='Card.TFrame', padding=20)
         config_card.grid(row=2, column=0, sticky="ew", pady=(0, 20))
         config_card.grid_columnconfigure(1, weight=1)
-        ttk.Label(config_card, text="Step 2: Configure Columns", font=('Segoe UI', 14, 'bold')).grid(row=0, column=0, columnspan=4, sticky="w", pady=(0, 15))
+        ttk.Label(config_card, text="Step 2: Configure Columns and Rules", font=('Segoe UI', 14, 'bold')).grid(row=0, column=0, columnspan=4, sticky="w", pady=(0, 15))
 
         ttk.Label(config_card, text="Current Filename Column:").grid(row=1, column=0, sticky="w", padx=(0, 5))
         self.current_col_var = tk.StringVar()
@@ -104,6 +113,33 @@ class BulkRenameModule:
         self.new_col_combo = ttk.Combobox(config_card, textvariable=self.new_col_var, state='readonly', width=25)
         self.new_col_combo.grid(row=1, column=3, sticky="w")
 
+        # Pattern rule for names that are not in the template (or for everything when no template is used)
+        ttk.Label(config_card, text="Rule Pattern:").grid(row=2, column=0, sticky="w", padx=(0, 5), pady=(10, 0))
+        self.rule_pattern_var = tk.StringVar(value="*")
+        ttk.Entry(config_card, textvariable=self.rule_pattern_var, width=28).grid(row=2, column=1, sticky="w", padx=(0, 20), pady=(10, 0))
+
+        ttk.Label(config_card, text="Pattern Type:").grid(row=2, column=2, sticky="w", padx=(0, 5), pady=(10, 0))
+        self.rule_mode_var = tk.StringVar(value=MODE_GLOB)
+        ttk.Combobox(config_card, textvariable=self.rule_mode_var, values=MODES, state='readonly', width=25).grid(row=2, column=3, sticky="w", pady=(10, 0))
+
+        ttk.Label(config_card, text="New Name Template:").grid(row=3, column=0, sticky="w", padx=(0, 5), pady=(10, 0))
+        self.rule_template_var = tk.StringVar(value="{name}{ext}")
+        ttk.Entry(config_card, textvariable=self.rule_template_var, width=28).grid(row=3, column=1, sticky="w", padx=(0, 20), pady=(10, 0))
+
+        ttk.Label(config_card, text="Case:").grid(row=3, column=2, sticky="w", padx=(0, 5), pady=(10, 0))
+        self.rule_case_var = tk.StringVar(value=CASE_KEEP)
+        ttk.Combobox(config_card, textvariable=self.rule_case_var, values=CASES, state='readonly', width=25).grid(row=3, column=3, sticky="w", pady=(10, 0))
+
+        ttk.Label(config_card, text="Fields: {name} {ext} {parent} {n:03d} {date:%Y%m%d} {created:%Y%m%d} {size} and regex groups {g1} {g2} ...",
+                  style='Status.TLabel').grid(row=4, column=0, columnspan=4, sticky="w", pady=(5, 0))
+
+        options_frame = ttk.Frame(config_card, style='Card.TFrame')
+        options_frame.grid(row=5, column=0, columnspan=4, sticky="w", pady=(10, 0))
+        self.use_rule = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Apply rule to names not in the template", variable=self.use_rule).pack(side='left', padx=(0, 20))
+        self.recursive = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Include subfolders", variable=self.recursive).pack(side='left')
+
         # --- Step 3: Preview & Execute ---
         preview_card = ttk.Frame(main_frame, style='Card.TFrame', padding=20)
         preview_card.grid(row=3, column=0, sticky="nsew", pady=(0, 20))
@@ -121,25 +157,15 @@ class BulkRenameModule:
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         search_entry.grid(row=0, column=1, sticky='ew')
 
-        # Treeview
-        tree_frame = ttk.Frame(preview_card)
-        tree_frame.grid(row=2, column=0, sticky="nsew")
-        tree_frame.grid_rowconfigure(0, weight=1)
-        tree_frame.grid_columnconfigure(0, weight=1)
-
+        # Preview table (only the visible rows are drawn)
         columns = ('current_name', 'new_name', 'status')
-        self.preview_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        self.preview_tree.heading('current_name', text='Current Filename')
-        self.preview_tree.heading('new_name', text='New Filename')
-        self.preview_tree.heading('status', text='Status')
-        self.preview_tree.column('current_name', width=250)
-        self.preview_tree.column('new_name', width=250)
-        self.preview_tree.column('status', width=150)
-        self.preview_tree.grid(row=0, column=0, sticky="nsew")
-
-        scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', command=self.preview_tree.yview)
-        self.preview_tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.grid(row=0, column=1, sticky='ns')
+        self.preview_tree = VirtualTable(
+            preview_card, columns=columns,
+            headings={'current_name': 'Current Filename', 'new_name': 'New Filename', 'status': 'Status'},
+            widths={'current_name': 250, 'new_name': 250, 'status': 150},
+            row_fn=lambda item: (item['current'], item['new'], item['status']),
+            tag_fn=lambda item: self._row_tag(item['status']))
+        self.preview_tree.grid(row=2, column=0, sticky="nsew")
 
         self.preview_tree.tag_configure('ready', foreground='#73d16e')
         self.preview_tree.tag_configure('skip', foreground='#f0e68c')
@@ -150,18 +176,28 @@ class BulkRenameModule:
         action_frame.grid(row=3, column=0, sticky="ew", pady=(15, 0))
         action_frame.grid_columnconfigure(1, weight=1)
 
-        self.create_backup = tk.BooleanVar(value=True)
-        ttk.Checkbutton(action_frame, text="Create backup before renaming", variable=self.create_backup).grid(row=0, column=0, sticky='w')
+        # Every rename is journaled and can be undone; a full copy is only made on request
+        self.create_backup = tk.BooleanVar(value=False)
+        ttk.Checkbutton(action_frame, text="Also copy files to a backup folder", variable=self.create_backup).grid(row=0, column=0, sticky='w')
+
+        self.plan_progress = ttk.Progressbar(action_frame, orient='horizontal', mode='indeterminate')
+        self.plan_progress.grid(row=0, column=1, sticky='ew', padx=20)
 
         button_group = ttk.Frame(action_frame)
         button_group.grid(row=0, column=2, sticky='e')
 
+        self.cancel_btn = ttk.Button(button_group, text="Cancel", command=self.cancel_preview, state='disabled', width=10)
+        self.cancel_btn.pack(side='right')
+
         self.preview_btn = ttk.Button(button_group, text="Generate Preview", command=self.generate_preview, width=20)
         self.preview_btn.pack(side='right', padx=(0, 10))
 
         self.rename_btn = ttk.Button(button_group, text="Rename Files", command=self.execute_rename, state='disabled', width=20)
         self.rename_btn.pack(side='right', padx=(0, 10))
 
+        self.undo_btn = ttk.Button(button_group, text="Undo Last Rename", command=self.undo_last_rename, state='disabled', width=20)
+        self.undo_btn.pack(side='right', padx=(0, 10))
+
         # Status bar
         self.status_var = tk.StringVar(value="Ready")
         status_label = ttk.Label(main_frame, textvariable=self.status_var, style='Status.TLabel')
@@ -180,6 +216,7 @@ class BulkRenameModule:
                 messagebox.showinfo("Info", "No items found in the source directory.")
                 return
 
+            import pandas as pd
             df = pd.DataFrame({'Current Name': items, 'New Name': ''})
 
             save_path = filedialog.asksaveasfilename(
@@ -219,12 +256,67 @@ class BulkRenameModule:
             if self.template_data is not None:
                 self.preview_btn.config(state='normal')
             self.status_var.set("Source folder selected. Ready to generate preview.")
+            self.recover_interrupted_renames()
+            self._update_undo_button()
+
+    def _update_undo_button(self):
+        has_journal = bool(self.source_folder and find_journals(self.source_folder, STATE_COMMITTED))
+        self.undo_btn.config(state='normal' if has_journal else 'disabled')
+
+    def recover_interrupted_renames(self):
+        """Offer to resume or roll back renames that were cut short by a crash or power loss"""
+        for journal in find_journals(self.source_folder, STATE_PENDING):
+            answer = messagebox.askyesnocancel(
+                "Interrupted Rename",
+                f"A previous rename in this folder was interrupted after {journal.done_count()} of "
+                f"{len(journal.operations)} files.\n\nYes: finish the remaining renames\n"
+                f"No: roll back to the original names\nCancel: decide later")
+            if answer is None:
+                continue
+            try:
+                if answer:
+                    count, errors = journal.apply()
+                    summary = f"Resumed rename: {count} more files renamed."
+                else:
+                    count, errors = journal.rollback()
+                    summary = f"Rolled back: {count} files restored."
+                if errors:
+                    messagebox.showwarning("Recovery Complete with Errors", f"{summary}\n\nErrors:\n" + "\n".join(errors))
+                self.status_var.set(summary)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to recover interrupted rename: {e}")
+                self.status_var.set("Error recovering interrupted rename.")
+
+    def undo_last_rename(self):
+        """Roll back the most recent completed rename in the source folder using its journal"""
+        journals = find_journals(self.source_folder, STATE_COMMITTED) if self.source_folder else []
+        if not journals:
+            messagebox.showinfo("Info", "There is no rename to undo in this folder.")
+            return
+        journal = journals[0]
+        if not messagebox.askyesno("Confirm Undo", f"Restore the original names of {journal.done_count()} files?"):
+            return
+        try:
+            self.status_var.set("Undoing rename...")
+            restored_count, errors = journal.rollback()
+            if errors:
+                messagebox.showwarning("Undo Complete with Errors", f"Restored {restored_count} files.\n\nErrors:\n" + "\n".join(errors))
+            else:
+                messagebox.showinfo("Success", f"Restored the original names of {restored_count} files.")
+            self.status_var.set(f"Undo complete. {restored_count} files restored.")
+            self._update_undo_button()
+            if self.template_data is not None and self.current_col_var.get() and self.new_col_var.get():
+                self.generate_preview()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to undo rename: {e}")
+            self.status_var.set("Error during undo.")
 
     def load_template(self):
         """Load the Excel template and populate column dropdowns"""
         if not self.template_path:
             return
         try:
+            import pandas as pd
             self.template_data = pd.read_excel(self.template_path)
             columns = self.template_data.columns.tolist()
             self.current_col_combo['values'] = columns
@@ -244,86 +336,144 @@ class BulkRenameModule:
             self.status_var.set("Error loading template.")
 
     def generate_preview(self):
-        """Generate preview of rename operations"""
-        if not all([self.source_folder, self.template_data is not None, self.current_col_var.get(), self.new_col_var.get()]):
-            messagebox.showwarning("Warning", "Please select template, source folder, and columns.")
+        """Start planning the rename on a background thread; rows stream into the preview as they are found"""
+        use_template = all([self.template_data is not None, self.current_col_var.get(), self.new_col_var.get()])
+        if not self.source_folder or not (use_template or self.use_rule.get()):
+            messagebox.showwarning("Warning", "Please select a source folder and either a template with columns or a rename rule.")
             return
 
         try:
+            rule = None
+            if self.use_rule.get():
+                rule = RenameRule(self.rule_pattern_var.get(), self.rule_mode_var.get(), self.rule_template_var.get(), self.rule_case_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid rename rule: {e}")
+            self.status_var.set("Error in rename rule.")
+            return
+
+        try:
+            self.cancel_preview()
             self.status_var.set("Generating preview...")
-            self.preview_tree.delete(*self.preview_tree.get_children())
             self.preview_data = []
+            self.search_index = SearchIndex()
+            self.preview_tree.set_source(self.preview_data)
+            self.search_files()
             self.rename_btn.config(state='disabled')
 
-            current_col = self.current_col_var.get()
-            new_col = self.new_col_var.get()
-            
-            self.rename_mapping = dict(zip(self.template_data[current_col].astype(str), self.template_data[new_col].astype(str)))
+            self.rename_mapping = {}
+            if use_template:
+                current_col = self.current_col_var.get()
+                new_col = self.new_col_var.get()
+                self.rename_mapping = build_rename_mapping(self.template_data[current_col].astype(str), self.template_data[new_col].astype(str))
 
-            all_paths = glob.glob(os.path.join(self.source_folder, '*'))
-            source_items = [os.path.basename(path) for path in all_paths if not os.path.basename(path).startswith('backup_')]
-
-            for filename in source_items:
-                if filename in self.rename_mapping:
-                    new_name_from_template = self.rename_mapping[filename]
-
-                    # Handle cases where 'New Name' in Excel is blank or just whitespace
-                    if pd.isna(new_name_from_template) or str(new_name_from_template).strip() in ['', 'nan']:
-                        self.preview_tree.insert('', 'end', values=(filename, "No change", "ℹ️ New name is empty"), tags=('skip',))
-                        continue
-
-                    new_name_str = str(new_name_from_template).strip()
-                    
-                    # If the new name from the template doesn't have an extension, reuse the old one
-                    _ , old_ext = os.path.splitext(filename)
-                    _ , new_ext = os.path.splitext(new_name_str)
-
-                    if not new_ext and old_ext:
-                        final_new_name = f"{new_name_str}{old_ext}"
-                    else:
-                        final_new_name = new_name_str
-
-                    status = "✅ Ready"
-                    self.preview_tree.insert('', 'end', values=(filename, final_new_name, status), tags=('ready',))
-                    self.preview_data.append({'current': filename, 'new': final_new_name, 'status': status})
-                else:
-                    self.preview_tree.insert('', 'end', values=(filename, "No change", "ℹ️ Not in template"), tags=('skip',))
-            
-            if any(item['status'] == "✅ Ready" for item in self.preview_data):
-                self.rename_btn.config(state='normal')
-                
-            self.status_var.set(f"Preview generated: {len(source_items)} items checked.")
+            self.plan_queue = queue.Queue()
+            self.plan_cancel = threading.Event()
+            thread = threading.Thread(target=self._plan_worker,
+                                      args=(self.source_folder, self.rename_mapping, self.plan_queue, self.plan_cancel,
+                                            rule, self.recursive.get()), daemon=True)
+            thread.start()
+
+            self.cancel_btn.config(state='normal')
+            self.plan_progress.start(10)
+            self.parent.after(50, self._drain_plan_queue, self.plan_queue)
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate preview: {str(e)}")
             self.status_var.set("Error generating preview.")
 
-    def search_files(self, *args):
-        query = self.search_var.get().lower()
-        self.preview_tree.delete(*self.preview_tree.get_children())
+    def cancel_preview(self):
+        """Stop a preview that is still being planned"""
+        if self.plan_cancel is not None:
+            self.plan_cancel.set()
 
-        if not self.preview_data:
+    @staticmethod
+    def _plan_worker(source_folder, rename_mapping, plan_queue, cancel_event, rule=None, recursive=False):
+        try:
+            items = []
+            for batch in iter_rename_plan(source_folder, rename_mapping, cancel_event=cancel_event, rule=rule, recursive=recursive):
+                items.extend(batch)
+                plan_queue.put(('rows', batch))
+            if cancel_event.is_set():
+                plan_queue.put(('cancelled', None))
+                return
+            # Collision checking lists every parent folder of the plan, so it stays off the Tk thread too.
+            # The rows belong to the Tk thread by now; their new statuses are applied there.
+            _, conflicts = find_conflicts(source_folder, items)
+            plan_queue.put(('conflicts', conflicts))
+            plan_queue.put(('done', None))
+        except Exception as e:
+            plan_queue.put(('error', e))
+
+    def _drain_plan_queue(self, plan_queue, max_batches=10):
+        """Move planned rows from the worker into the preview a few batches per tick"""
+        if plan_queue is not self.plan_queue:
+            return  # a newer preview has replaced this one
+
+        for _ in range(max_batches):
+            try:
+                kind, payload = plan_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == 'rows':
+                self.preview_data.extend(payload)
+                self.search_index.extend((item['current'], item['new']) for item in payload)
+                # Repeating the current query only checks the new rows and grows the shown results in place
+                self.search_index.search(self.search_var.get())
+                self.preview_tree.refresh()
+                continue
+            if kind == 'conflicts':
+                apply_conflicts(self.preview_data, payload)
+                continue
+
+            self._finish_preview(kind, payload)
             return
 
-        for item in self.preview_data:
-            current_name = item.get('current', '')
-            new_name = item.get('new', 'No change')
-            status = item.get('status', '')
-            
-            if query in current_name.lower() or query in new_name.lower():
-                tag = ''
-                if status == "✅ Ready":
-                    tag = 'ready'
-                elif status == "ℹ️ Not in template":
-                    tag = 'skip'
-                elif "Error" in status or "Exists" in status:
-                    tag = 'error'
-                
-                self.preview_tree.insert('', 'end', values=(current_name, new_name, status), tags=(tag,))
+        self.status_var.set(f"Generating preview... {len(self.preview_data):,} items checked.")
+        self.parent.after(20, self._drain_plan_queue, plan_queue)
+
+    def _finish_preview(self, kind, payload):
+        self.plan_progress.stop()
+        self.cancel_btn.config(state='disabled')
+        self.plan_queue = None
+        self.plan_cancel = None
+
+        if kind == 'error':
+            messagebox.showerror("Error", f"Failed to generate preview: {str(payload)}")
+            self.status_var.set("Error generating preview.")
+            return
+
+        if kind == 'done':
+            self.preview_tree.refresh()
+
+        if any(item['status'] == STATUS_READY for item in self.preview_data):
+            self.rename_btn.config(state='normal')
+
+        if kind == 'cancelled':
+            self.status_var.set(f"Preview cancelled after {len(self.preview_data):,} items.")
+        else:
+            self.status_var.set(f"Preview generated: {len(self.preview_data):,} items checked.")
+
+    @staticmethod
+    def _row_tag(status):
+        if status in ("✅ Ready", "✅ Renamed"):
+            return 'ready'
+        if status.startswith("ℹ️"):
+            return 'skip'
+        if "Error" in status or status.startswith(("❌", "⚠️")):
+            return 'error'
+        return ''
+
+    def search_files(self, *args):
+        self.preview_tree.set_view(self.search_index.search(self.search_var.get()))
 
     def execute_rename(self):
         """Execute the rename operations"""
-        ready_items = [item for item in self.preview_data if item['status'] == "✅ Ready"]
+        if self.plan_queue is not None:
+            messagebox.showinfo("Info", "Please wait for the preview to finish.")
+            return
+
+        ready_items = [item for item in self.preview_data if item['status'] == STATUS_READY]
         if not ready_items:
             messagebox.showinfo("Info", "No files are ready for renaming.")
             return
@@ -333,44 +483,20 @@ class BulkRenameModule:
 
         try:
             self.status_var.set("Renaming files...")
-            renamed_count = 0
-            errors = []
-
-            if self.create_backup.get():
-                backup_folder = os.path.join(self.source_folder, f"backup_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}")
-                os.makedirs(backup_folder, exist_ok=True)
-                for item in ready_items:
-                    source_path = os.path.join(self.source_folder, item['current'])
-                    dest_path = os.path.join(backup_folder, item['current'])
-                    if os.path.isdir(source_path):
-                        shutil.copytree(source_path, dest_path)
-                    else:
-                        shutil.copy2(source_path, backup_folder)
-
-            for item in ready_items:
-                try:
-                    current_path = os.path.join(self.source_folder, item['current'])
-                    new_path = os.path.join(self.source_folder, item['new'])
-                    
-                    if os.path.exists(new_path):
-                        raise FileExistsError(f"Target file '{item['new']}' already exists.")
-
-                    os.rename(current_path, new_path)
-                    renamed_count += 1
-                    item['status'] = "✅ Renamed"
-                except Exception as e:
-                    errors.append(f"{item['current']} -> {item['new']}: {e}")
-                    item['status'] = "❌ Error"
+            result = execute_renames(self.source_folder, ready_items, self.create_backup.get())
+            renamed_count, errors, backup_summary = result['renamed'], result['errors'], result['backup']
+            self._update_undo_button()
             
             self.generate_preview() # Refresh the preview
             
+            backup_note = f"\n\n{backup_summary}" if backup_summary else ""
             if errors:
                 error_details = "\n".join(errors)
-                messagebox.showwarning("Rename Complete with Errors", f"Renamed {renamed_count} files.\n\nErrors occurred:\n{error_details}")
+                messagebox.showwarning("Rename Complete with Errors", f"Renamed {renamed_count} files.{backup_note}\n\nErrors occurred:\n{error_details}")
             else:
-                messagebox.showinfo("Success", f"Successfully renamed {renamed_count} files!")
+                messagebox.showinfo("Success", f"Successfully renamed {renamed_count} files!{backup_note}")
 
-            self.status_var.set(f"Rename complete. {renamed_count} files processed.")
+            self.status_var.set(f"Rename complete. {renamed_count} files processed." + (f" {backup_summary}" if backup_summary else ""))
             self.rename_btn.config(state='disabled')
 
         except Exception as e:
@@ -1,11 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import pandas as pd
 import os
+import threading
 from typing import Dict
-
-# Import the template creation function
-from templates.create_templates import create_folder_creator_template
+from engine.folder_creator import load_folder_template, plan_folders, diff_folders, create_folders, STATUS_READY, STATUS_CONFLICT
+from engine.folder_snapshot import FolderSnapshot
+from engine.scaffold import load_scaffold
+from engine.search_index import SearchIndex
+from modules.virtual_table import VirtualTable, debounce_search
 
 class FolderCreatorModule:
     def __init__(self, parent):
@@ -15,12 +17,17 @@ class FolderCreatorModule:
         self.template_path = None
         self.template_data = None
         self.output_folder = None
+        # Folder of starter files copied or rendered into every new folder
+        self.starter_folder = None
         self.folder_structure = []
+        # What the output folder holds, listed once and kept current across previews and runs
+        self.folder_snapshot = FolderSnapshot()
+        self.search_index = SearchIndex()
         self.search_var = tk.StringVar()
 
         self.setup_styles()
         self.create_widgets()
-        self.search_var.trace_add("write", self.search_folders)
+        debounce_search(self.parent, self.search_var, self.search_folders)
 
     def setup_styles(self):
         """Configure custom styles for the module"""
@@ -92,10 +99,12 @@ class FolderCreatorModule:
         self.folder_name_col_var = tk.StringVar()
         self.folder_name_combo = ttk.Combobox(col_frame, textvariable=self.folder_name_col_var, state='readonly', width=25)
         self.folder_name_combo.pack(side='left', padx=(0, 20))
-        ttk.Label(col_frame, text="Parent Folder Column:").pack(side='left', padx=(0, 10))
-        self.parent_folder_col_var = tk.StringVar()
-        self.parent_folder_combo = ttk.Combobox(col_frame, textvariable=self.parent_folder_col_var, state='readonly', width=25)
-        self.parent_folder_combo.pack(side='left')
+        ttk.Label(col_frame, text="Parent Folder Columns:").pack(side='left', padx=(0, 10))
+        # Several columns make nested levels, outermost first, in template order
+        self.parent_folder_listbox = tk.Listbox(col_frame, selectmode='multiple', exportselection=False, background='#1e1e1e',
+                                                foreground='white', borderwidth=0, highlightthickness=0, font=('Segoe UI', 10),
+                                                height=3, width=25)
+        self.parent_folder_listbox.pack(side='left')
 
         # Search row
         search_frame = ttk.Frame(preview_card)
@@ -105,22 +114,14 @@ class FolderCreatorModule:
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         search_entry.grid(row=0, column=1, sticky='ew')
 
-        # Preview tree in a frame to manage scrollbar
-        tree_frame = ttk.Frame(preview_card)
-        tree_frame.grid(row=3, column=0, sticky='nsew')
-        tree_frame.grid_rowconfigure(0, weight=1)
-        tree_frame.grid_columnconfigure(0, weight=1)
+        # Preview table (only the visible rows are drawn)
         columns = ('name', 'parent', 'path', 'status')
-        self.preview_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        self.preview_tree.grid(row=0, column=0, sticky='nsew')
-        self.preview_tree.heading('name', text='Folder Name')
-        self.preview_tree.heading('parent', text='Parent Folder')
-        self.preview_tree.heading('path', text='Relative Path')
-        self.preview_tree.heading('status', text='Status')
-        self.preview_tree.column('name', width=200)
-        self.preview_tree.column('parent', width=150)
-        self.preview_tree.column('path', width=300)
-        self.preview_tree.column('status', width=120)
+        self.preview_tree = VirtualTable(
+            preview_card, columns=columns,
+            headings={'name': 'Folder Name', 'parent': 'Parent Folder', 'path': 'Relative Path', 'status': 'Status'},
+            widths={'name': 200, 'parent': 150, 'path': 300, 'status': 120},
+            row_fn=self._folder_row)
+        self.preview_tree.grid(row=3, column=0, sticky='nsew')
 
         # Action buttons
         action_frame = ttk.Frame(preview_card)
@@ -129,6 +130,16 @@ class FolderCreatorModule:
 
         self.create_readme = tk.BooleanVar(value=False)
         ttk.Checkbutton(action_frame, text="Create README.txt in each folder", variable=self.create_readme).grid(row=0, column=0, sticky='w')
+        self.progress_bar = ttk.Progressbar(action_frame, orient='horizontal', mode='determinate')
+        self.progress_bar.grid(row=0, column=1, sticky='ew', padx=20)
+
+        starter_frame = ttk.Frame(action_frame)
+        starter_frame.grid(row=1, column=0, columnspan=3, sticky='w', pady=(10, 0))
+        ttk.Button(starter_frame, text="Starter Files Folder", command=self.browse_starter_folder, width=20).pack(side='left', padx=(0, 10))
+        self.starter_path_var = tk.StringVar(value="No starter files")
+        ttk.Label(starter_frame, textvariable=self.starter_path_var, style='Status.TLabel').pack(side='left', padx=(0, 20))
+        self.hard_link_starters = tk.BooleanVar(value=False)
+        ttk.Checkbutton(starter_frame, text="Hard-link static files (read-only use)", variable=self.hard_link_starters).pack(side='left')
 
         button_group = ttk.Frame(action_frame)
         button_group.grid(row=0, column=2, sticky='e')
@@ -146,6 +157,7 @@ class FolderCreatorModule:
     def generate_template(self):
         """Generate a sample Excel template for folder creation."""
         try:
+            from templates.create_templates import create_folder_creator_template
             df = create_folder_creator_template()
             save_path = filedialog.asksaveasfilename(
                 title="Save Sample Template",
@@ -175,23 +187,31 @@ class FolderCreatorModule:
         path = filedialog.askdirectory()
         if path:
             self.output_folder = path
+            self.folder_snapshot = FolderSnapshot()
             self.output_path_var.set(path)
             if self.template_data is not None:
                 self.preview_btn.config(state='normal')
             self.status_var.set("Output location selected. Ready to generate preview.")
 
+    def browse_starter_folder(self):
+        path = filedialog.askdirectory(title="Folder with starter files ('.tmpl' files are filled from the template)")
+        self.starter_folder = path or None
+        self.starter_path_var.set(path or "No starter files")
+
     def load_template(self):
         if not self.template_path:
             return
         try:
-            self.template_data = pd.read_excel(self.template_path, na_filter=False)
+            self.template_data = load_folder_template(self.template_path)
             columns = self.template_data.columns.tolist()
             self.folder_name_combo['values'] = columns
-            self.parent_folder_combo['values'] = [''] + columns
+            self.parent_folder_listbox.delete(0, tk.END)
+            for column in columns:
+                self.parent_folder_listbox.insert(tk.END, column)
             if 'Folder Name' in columns:
                 self.folder_name_col_var.set('Folder Name')
             if 'Parent Folder' in columns:
-                self.parent_folder_col_var.set('Parent Folder')
+                self.parent_folder_listbox.selection_set(columns.index('Parent Folder'))
             if self.output_folder:
                 self.preview_btn.config(state='normal')
         except Exception as e:
@@ -204,95 +224,101 @@ class FolderCreatorModule:
             return
         try:
             self.status_var.set("Generating preview...")
-            self.preview_tree.delete(*self.preview_tree.get_children())
             self.folder_structure = []
+            self.search_index = SearchIndex()
+            self.preview_tree.set_source(self.folder_structure)
             self.create_btn.config(state='disabled')
 
-            folder_col = self.folder_name_col_var.get()
-            parent_col = self.parent_folder_col_var.get()
-
-            for _, row in self.template_data.iterrows():
-                folder_name = str(row[folder_col]).strip()
-                if not folder_name:
-                    continue
-                
-                parent_name = str(row[parent_col]).strip() if parent_col and parent_col in row and pd.notna(row[parent_col]) and str(row[parent_col]).strip() else ""
-                
-                full_path = os.path.join(self.output_folder, parent_name, folder_name) if parent_name else os.path.join(self.output_folder, folder_name)
-                
-                status = "⚠️ Exists" if os.path.exists(full_path) else "✅ Ready"
-                
-                item = {'name': folder_name, 'parent': parent_name, 'full_path': full_path, 'status': status}
-                self.folder_structure.append(item)
-                self.preview_tree.insert('', 'end', values=(folder_name, parent_name if parent_name else "<ROOT>", os.path.relpath(full_path, self.output_folder), status))
-
-            if any(item['status'] == "✅ Ready" for item in self.folder_structure):
-                self.create_btn.config(state='normal')
-            self.status_var.set(f"Preview generated: {len(self.folder_structure)} folders planned.")
+            parent_columns = [self.parent_folder_listbox.get(i) for i in self.parent_folder_listbox.curselection()]
+            self.folder_structure.extend(plan_folders(self.template_data, self.output_folder,
+                                                      self.folder_name_col_var.get(), parent_columns,
+                                                      self.folder_snapshot))
+
+            self.search_index.extend(item['name'] for item in self.folder_structure)
+            self.search_folders()
+
+            self._update_create_button()
+            self.status_var.set(f"Preview generated: {len(self.folder_structure)} folders planned{self._conflict_note()}.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate preview: {str(e)}")
             self.status_var.set("Error generating preview.")
 
-    def search_folders(self, *args):
-        query = self.search_var.get().lower()
-        self.preview_tree.delete(*self.preview_tree.get_children())
+    def _update_create_button(self):
+        ready = any(item['status'] == STATUS_READY for item in self.folder_structure)
+        self.create_btn.config(state='normal' if ready else 'disabled')
 
-        if not self.folder_structure:
-            return
+    def _conflict_note(self):
+        conflicts = sum(1 for item in self.folder_structure if item['status'] == STATUS_CONFLICT)
+        return f", {conflicts} blocked by files" if conflicts else ""
 
-        if not query:
-            # If search is cleared, show all items from the original preview
-            for item in self.folder_structure:
-                self.preview_tree.insert('', 'end', values=(
-                    item['name'], 
-                    item['parent'] if item['parent'] else "<ROOT>", 
-                    os.path.relpath(item['full_path'], self.output_folder),
-                    item['status']
-                ))
-        else:
-            # Filter and show only matching items
-            for item in self.folder_structure:
-                if query in item['name'].lower():
-                    self.preview_tree.insert('', 'end', values=(
-                        item['name'], 
-                        item['parent'] if item['parent'] else "<ROOT>", 
-                        os.path.relpath(item['full_path'], self.output_folder),
-                        item['status']
-                    ))
+    def _folder_row(self, item):
+        return (item['name'], item['parent'] if item['parent'] else "<ROOT>",
+                os.path.relpath(item['full_path'], self.output_folder), item['status'])
+
+    def search_folders(self, *args):
+        self.preview_tree.set_view(self.search_index.search(self.search_var.get()))
 
     def create_folders(self):
-        ready_items = [item for item in self.folder_structure if item['status'] == "✅ Ready"]
+        ready_items = [item for item in self.folder_structure if item['status'] == STATUS_READY]
         if not ready_items:
             messagebox.showinfo("Info", "No new folders to create.")
             return
+        scaffold = None
+        if self.starter_folder:
+            try:
+                scaffold = load_scaffold(self.starter_folder, self.template_data, self.hard_link_starters.get())
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to load starter files: {str(e)}")
+                return
         if not messagebox.askyesno("Confirm Creation", f"Are you sure you want to create {len(ready_items)} folders?"):
             return
+        self.status_var.set("Creating folders...")
+        self.create_btn.config(state='disabled')
+        self.preview_btn.config(state='disabled')
+        self.progress_bar['maximum'] = len(ready_items)
+        self.progress_bar['value'] = 0
+        thread = threading.Thread(target=self._create_folders_thread, args=(ready_items, self.create_readme.get(), scaffold), daemon=True)
+        thread.start()
+
+    def _create_folders_thread(self, items, create_readme, scaffold):
+        counts = {'finished': 0}
+
+        def on_progress(item):
+            counts['finished'] += 1
+            # Redrawing for every folder would flood the Tk event queue on large structures
+            if counts['finished'] % 100 == 0 or counts['finished'] == len(items):
+                self.parent.after(0, self._show_creation_progress, counts['finished'], len(items))
+
         try:
-            self.status_var.set("Creating folders...")
-            created_count = 0
-            errors = []
-
-            for item in ready_items:
-                try:
-                    os.makedirs(item['full_path'], exist_ok=True)
-                    if self.create_readme.get():
-                        with open(os.path.join(item['full_path'], "README.txt"), 'w', encoding='utf-8') as f:
-                            f.write(f"Folder created by EruStudio.\nName: {item['name']}\nParent: {item['parent'] or 'N/A'}")
-                    created_count += 1
-                    item['status'] = "✅ Created"
-                except Exception as e:
-                    errors.append(f"{item['name']}: {e}")
-                    item['status'] = "❌ Error"
-            
-            self.generate_preview() # Refresh preview
-
-            if errors:
-                messagebox.showwarning("Creation Complete with Errors", f"Created {created_count} folders.\n\nErrors:\n" + "\n".join(errors))
-            else:
-                messagebox.showinfo("Success", f"Successfully created {created_count} folders!")
-            
-            self.status_var.set(f"Creation complete. {created_count} folders processed.")
-            self.create_btn.config(state='disabled')
+            created_count, errors = create_folders(items, create_readme, on_progress=on_progress, scaffold=scaffold,
+                                                   snapshot=self.folder_snapshot)
+            error = None
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to create folders: {str(e)}")
-            self.status_var.set("Error creating folders.")
\ No newline at end of file
+            created_count, errors, error = counts['finished'], [], e
+        summary = scaffold.describe() if scaffold is not None else ""
+        self.parent.after(0, self.finalize_creation, created_count, errors, error, summary)
+
+    def _show_creation_progress(self, finished, total):
+        self.progress_bar['value'] = finished
+        self.status_var.set(f"Created {finished:,} of {total:,} folders...")
+        self.preview_tree.refresh()
+
+    def finalize_creation(self, created_count, errors, error=None, summary=""):
+        self.preview_btn.config(state='normal')
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to create folders: {str(error)}")
+            self.status_var.set("Error creating folders.")
+            return
+
+        # The snapshot already holds the new folders, so the preview is re-diffed without scanning the output folder
+        diff_folders(self.folder_structure, self.folder_snapshot)
+        self.preview_tree.refresh()
+
+        if errors:
+            messagebox.showwarning("Creation Complete with Errors", f"Created {created_count} folders.\n\nErrors:\n" + "\n".join(errors))
+        else:
+            messagebox.showinfo("Success", f"Successfully created {created_count} folders!\n{summary}")
+
+        self.status_var.set(f"Creation complete. {created_count} folders processed. {summary}")
+        # Folders that failed stay Ready, so creating again retries just those
+        self._update_create_button()
\ No newline at end of file
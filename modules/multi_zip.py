@@ -1,10 +1,14 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import zipfile
 import threading
 from typing import Dict
-import pandas as pd
+
+from engine.multi_zip import default_worker_count, plan_zip_tasks, run_zip_tasks, STATUS_READY, STATUS_EXISTS
+from engine.compression_policy import POLICIES, DEFAULT_POLICY
+from engine.folder_index import FolderIndex
+from engine.search_index import SearchIndex
+from modules.virtual_table import VirtualTable, debounce_search
 
 # Import the template creation function
 
@@ -17,12 +21,14 @@ class MultiZipModule:
         self.output_folder = None
         self.template_path = None
         self.zip_tasks = []
+        self.search_index = SearchIndex()
+        self.folder_index = FolderIndex()
         self.search_var = tk.StringVar()
         self.template_path_var = tk.StringVar(value="No template selected")
 
         self.setup_styles()
         self.create_widgets()
-        self.search_var.trace_add("write", self.search_folders)
+        debounce_search(self.parent, self.search_var, self.search_folders)
 
     def setup_styles(self):
         """Configure custom styles for the module"""
@@ -88,6 +94,18 @@ class MultiZipModule:
         ttk.Checkbutton(options_frame, text="Zip top-level folders only", variable=self.zip_top_level_only, command=self.scan_folders).pack(side='left', padx=(0, 20))
         self.include_root_dir = tk.BooleanVar(value=False)
         ttk.Checkbutton(options_frame, text="Include root folder in archive", variable=self.include_root_dir).pack(side='left', padx=(0, 20))
+        ttk.Label(options_frame, text="Parallel workers:").pack(side='left', padx=(0, 5))
+        self.worker_count = tk.IntVar(value=default_worker_count())
+        ttk.Spinbox(options_frame, from_=1, to=max(32, default_worker_count()), textvariable=self.worker_count, width=5).pack(side='left', padx=(0, 20))
+        self.use_processes = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Use separate processes", variable=self.use_processes).pack(side='left', padx=(0, 20))
+        self.split_members = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Split large archives across workers", variable=self.split_members).pack(side='left', padx=(0, 20))
+        ttk.Label(options_frame, text="Compression:").pack(side='left', padx=(0, 5))
+        self.policy_var = tk.StringVar(value=DEFAULT_POLICY)
+        ttk.Combobox(options_frame, textvariable=self.policy_var, values=list(POLICIES), state='readonly', width=15).pack(side='left', padx=(0, 20))
+        self.incremental = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Update existing archives", variable=self.incremental, command=self._update_zip_button).pack(side='left')
 
         # --- Search Bar ---
         search_frame = ttk.Frame(preview_card)
@@ -97,25 +115,15 @@ class MultiZipModule:
         search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
         search_entry.grid(row=0, column=1, sticky='ew')
 
-        # --- Treeview for Preview ---     
-        tree_frame = ttk.Frame(preview_card)
-        tree_frame.grid(row=3, column=0, columnspan=2, sticky="nsew")
-        tree_frame.grid_columnconfigure(0, weight=1)
-        tree_frame.grid_rowconfigure(0, weight=1)
-        columns = ('name', 'path', 'size', 'status')
-        self.preview_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        self.preview_tree.heading('name', text='Folder Name')
-        self.preview_tree.heading('path', text='Relative Path')
-        self.preview_tree.heading('size', text='Size')
-        self.preview_tree.heading('status', text='Status')
-        self.preview_tree.column('name', width=200)
-        self.preview_tree.column('path', width=250)
-        self.preview_tree.column('size', width=100, anchor='e')
-        self.preview_tree.column('status', width=120)
-        self.preview_tree.grid(row=0, column=0, sticky="nsew")
-        scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', command=self.preview_tree.yview)
-        self.preview_tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.grid(row=0, column=1, sticky='ns')
+        # --- Preview table (only the visible rows are drawn) ---
+        columns = ('name', 'path', 'size', 'files', 'status')
+        self.preview_tree = VirtualTable(
+            preview_card, columns=columns,
+            headings={'name': 'Folder Name', 'path': 'Relative Path', 'size': 'Size', 'files': 'Files', 'status': 'Status'},
+            widths={'name': 200, 'path': 250, 'size': 100, 'files': 80, 'status': 120},
+            anchors={'size': 'e', 'files': 'e'},
+            row_fn=self._task_row)
+        self.preview_tree.grid(row=3, column=0, columnspan=2, sticky="nsew")
 
         # --- Step 3: Execution ---
         action_card = ttk.Frame(main_frame, style='Card.TFrame', padding=20)
@@ -142,6 +150,7 @@ class MultiZipModule:
                 messagebox.showinfo("Info", "No folders found in the source directory.")
                 return
 
+            import pandas as pd
             df = pd.DataFrame({'Folder Name': folder_names})
             
             save_path = filedialog.asksaveasfilename(
@@ -191,125 +200,128 @@ class MultiZipModule:
             return
 
         self.status_var.set("Scanning folders...")
-        self.preview_tree.delete(*self.preview_tree.get_children())
+        # Files written in place leave their folder's mtime alone, so a scan the user asks for starts from scratch
+        self.folder_index.invalidate()
         self.zip_tasks = []
+        self.search_index = SearchIndex()
+        self.preview_tree.set_source(self.zip_tasks)
         self.zip_btn.config(state='disabled')
 
         try:
-            folders_to_process = []
-            base_path = self.source_folder
-
-            if self.template_path:
-                df = pd.read_excel(self.template_path)
-                if 'Folder Name' not in df.columns:
-                    messagebox.showerror("Error", "Template must have a 'Folder Name' column.")
-                    self.status_var.set("Error: Invalid template.")
-                    return
-                
-                for folder_name in df['Folder Name'].dropna().astype(str):
-                    full_path = os.path.join(self.source_folder, folder_name)
-                    if os.path.isdir(full_path):
-                        folders_to_process.append({'name': folder_name, 'path': full_path})
-            else: # Fallback to original behavior
-                if self.zip_top_level_only.get():
-                    for d in os.listdir(self.source_folder):
-                        full_path = os.path.join(self.source_folder, d)
-                        if os.path.isdir(full_path):
-                            folders_to_process.append({'name': d, 'path': full_path})
-                else:
-                    folders_to_process.append({'name': os.path.basename(self.source_folder), 'path': self.source_folder})
-                    base_path = os.path.dirname(self.source_folder)
-
-            for folder_info in folders_to_process:
-                folder_name, full_path = folder_info['name'], folder_info['path']
-                total_size = sum(os.path.getsize(os.path.join(dp, f)) for dp, dn, fn in os.walk(full_path) for f in fn)
-                size_str = f"{total_size / 1024 / 1024:.2f} MB" if total_size > 0 else "0 MB"
-
-                zip_filename = f"{folder_name}.zip"
-                zip_path = os.path.join(self.output_folder, zip_filename)
-                status = "⚠️ Exists" if os.path.exists(zip_path) else "✅ Ready"
-                
-                self.zip_tasks.append({'name': folder_name, 'path': full_path, 'zip_path': zip_path, 'status': status})
-                self.preview_tree.insert('', 'end', values=(folder_name, os.path.relpath(full_path, base_path), size_str, status))
-
-            if any(task['status'] == "✅ Ready" for task in self.zip_tasks):
-                self.zip_btn.config(state='normal')
+            self.zip_tasks.extend(plan_zip_tasks(self.source_folder, self.output_folder, self.template_path,
+                                                 self.zip_top_level_only.get(), self.folder_index))
+
+            self.search_index.extend(task['name'] for task in self.zip_tasks)
+            self.search_folders()
+            self._update_zip_button()
             self.status_var.set(f"Scan complete. Found {len(self.zip_tasks)} folder(s) to zip.")
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            self.status_var.set("Error: Invalid template.")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to scan folders: {e}")
             self.status_var.set("Error during folder scan.")
 
-    def search_folders(self, *args):
-        query = self.search_var.get().lower()
-        self.preview_tree.delete(*self.preview_tree.get_children())
-
-        if not self.zip_tasks:
-            return
+    def _task_row(self, task):
+        size_str = f"{task['size'] / 1024 / 1024:.2f} MB" if task['size'] > 0 else "0 MB"
+        return (task['name'], task['rel_path'], size_str, task['files'], task['status'])
 
-        base_path = self.source_folder
-        if self.zip_top_level_only.get():
-            base_path = self.source_folder
-        elif self.source_folder:
-            base_path = os.path.dirname(self.source_folder)
+    def refresh_preview(self):
+        """Refresh sizes and statuses from the folder index, rescanning only folders that changed on disk"""
+        for task in self.zip_tasks:
+            stats = self.folder_index.get(task['path'])
+            task['size'], task['files'] = stats['size'], stats['files']
+            task['status'] = STATUS_EXISTS if os.path.exists(task['zip_path']) else STATUS_READY
+        self.preview_tree.refresh()
+        self._update_zip_button()
 
-        def get_size_str(path):
-            try:
-                total_size = sum(os.path.getsize(os.path.join(dp, f)) for dp, dn, fn in os.walk(path) for f in fn)
-                return f"{total_size / 1024 / 1024:.2f} MB" if total_size > 0 else "0 MB"
-            except Exception:
-                return "N/A"
+    def _runnable_tasks(self):
+        """Tasks the next run will process; existing archives count only in update mode"""
+        statuses = (STATUS_READY, STATUS_EXISTS) if self.incremental.get() else (STATUS_READY,)
+        return [task for task in self.zip_tasks if task['status'] in statuses]
 
-        filtered_tasks = self.zip_tasks
-        if query:
-            filtered_tasks = [task for task in self.zip_tasks if query in task['name'].lower()]
+    def _update_zip_button(self):
+        self.zip_btn.config(state='normal' if self._runnable_tasks() else 'disabled')
 
-        for task in filtered_tasks:
-            size_str = get_size_str(task['path'])
-            rel_path = os.path.relpath(task['path'], base_path) if base_path else task['path']
-            self.preview_tree.insert('', 'end', values=(task['name'], rel_path, size_str, task['status']))
+    def search_folders(self, *args):
+        self.preview_tree.set_view(self.search_index.search(self.search_var.get()))
 
     def create_zip_files(self):
-        tasks_to_run = [task for task in self.zip_tasks if task['status'] == "✅ Ready"]
+        tasks_to_run = self._runnable_tasks()
         if not tasks_to_run:
             messagebox.showinfo("Info", "No new zip archives to create.")
             return
-        if not messagebox.askyesno("Confirm Zipping", f"Are you sure you want to create {len(tasks_to_run)} zip archive(s)?"):
+        update_count = sum(1 for task in tasks_to_run if task['status'] == STATUS_EXISTS)
+        prompt = f"Are you sure you want to create {len(tasks_to_run) - update_count} and update {update_count} zip archive(s)?" if update_count \
+            else f"Are you sure you want to create {len(tasks_to_run)} zip archive(s)?"
+        if not messagebox.askyesno("Confirm Zipping", prompt):
             return
         
         self.zip_btn.config(state='disabled')
         self.progress_bar['maximum'] = len(tasks_to_run)
         self.progress_bar['value'] = 0
-        thread = threading.Thread(target=self._create_zip_files_thread, args=(tasks_to_run,))
+        options = {
+            'include_root_dir': self.include_root_dir.get(),
+            'max_workers': max(1, self.worker_count.get()),
+            'use_processes': self.use_processes.get(),
+            'split_members': self.split_members.get(),
+            'policy': self.policy_var.get(),
+            'incremental': self.incremental.get(),
+        }
+        thread = threading.Thread(target=self._create_zip_files_thread, args=(tasks_to_run, options), daemon=True)
         thread.start()
 
-    def _create_zip_files_thread(self, tasks):
-        processed_count = 0
-        errors = []
-        for i, task in enumerate(tasks):
-            try:
-                self.parent.after(0, self.status_var.set, f"Zipping {task['name']}...")
-                with zipfile.ZipFile(task['zip_path'], 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    base_folder = os.path.dirname(task['path']) if self.include_root_dir.get() else task['path']
-                    for root, _, files in os.walk(task['path']):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, base_folder)
-                            zipf.write(file_path, arcname)
-                task['status'] = "✅ Zipped"
-                processed_count += 1
-            except Exception as e:
-                task['status'] = "❌ Error"
-                errors.append(f"{task['name']}: {e}")
-            finally:
-                self.parent.after(0, self.progress_bar.config, {'value': i + 1})
-        
-        self.parent.after(0, self.finalize_zipping, processed_count, errors)
+    def _set_task_status(self, task, status):
+        """Update a task's status and redraw the visible preview rows"""
+        task['status'] = status
+        self.preview_tree.refresh()
+
+    def _create_zip_files_thread(self, tasks, options):
+        counts = {'finished': 0, 'zipped': 0, 'bytes': 0, 'compressed_bytes': 0, 'cpu_seconds': 0.0}
+        self.parent.after(0, self.status_var.set, f"Zipping {len(tasks)} folder(s) with {options['max_workers']} worker(s)...")
+        for task in tasks:
+            self.parent.after(0, self._set_task_status, task, "⏳ Queued")
+
+        def on_start(task):
+            self.parent.after(0, self._set_task_status, task, "🔄 Zipping")
+
+        def on_progress(task, bytes_done):
+            percent = int(bytes_done * 100 / task['size']) if task.get('size') else 0
+            self.parent.after(0, self._set_task_status, task, f"🔄 Zipping {min(percent, 100)}%")
+
+        def on_done(task, result, error):
+            counts['finished'] += 1
+            if not error:
+                counts['zipped'] += 1
+                for key in ('bytes', 'compressed_bytes', 'cpu_seconds'):
+                    counts[key] += result[key]
+            if error:
+                status = "❌ Error"
+            elif 'unchanged' in result:
+                status = f"✅ Updated (+{result['added']} ~{result['updated']} -{result['removed']})"
+            else:
+                status = "✅ Zipped"
+            self.parent.after(0, self._set_task_status, task, status)
+            self.parent.after(0, self.progress_bar.config, {'value': counts['finished']})
+            self.parent.after(0, self.status_var.set, f"Finished {counts['finished']} of {len(tasks)}: {task['name']}")
 
-    def finalize_zipping(self, processed_count, errors):
-        self.scan_folders() # Refresh the preview
+        try:
+            processed_count, errors = run_zip_tasks(tasks, on_start=on_start, on_done=on_done, on_progress=on_progress, **options)
+        except Exception as e:
+            processed_count, errors = counts['zipped'], [f"Zipping stopped: {e}"]
+        
+        self.parent.after(0, self.finalize_zipping, processed_count, errors, counts)
+
+    def finalize_zipping(self, processed_count, errors, stats=None):
+        self.refresh_preview()
+        summary = ""
+        if stats and stats['bytes']:
+            saved = stats['bytes'] - stats['compressed_bytes']
+            summary = (f"Saved {saved / 1024 / 1024:.2f} MB ({saved * 100 / stats['bytes']:.1f}%) "
+                       f"for {stats['cpu_seconds']:.1f} CPU-seconds.")
         if errors:
-            messagebox.showwarning("Zipping Complete with Errors", f"Zipped {processed_count} folders.\n\nErrors:\n" + "\n".join(errors))
+            messagebox.showwarning("Zipping Complete with Errors", f"Zipped {processed_count} folders. {summary}\n\nErrors:\n" + "\n".join(errors))
         else:
-            messagebox.showinfo("Success", f"Successfully created {processed_count} zip archive(s)!")
-        self.status_var.set(f"Zipping complete. {processed_count} archives created.")
+            messagebox.showinfo("Success", f"Successfully created {processed_count} zip archive(s)!\n{summary}")
+        self.status_var.set(f"Zipping complete. {processed_count} archives created. {summary}")
         self.zip_btn.config(state='disabled')
\ No newline at end of file
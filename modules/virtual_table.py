@@ -0,0 +1,213 @@
+from tkinter import ttk
+
+# Used until the first row has been drawn and its real height can be measured
+DEFAULT_ROW_HEIGHT = 20
+
+# Pause in typing before a search box filters the preview
+SEARCH_DELAY_MS = 150
+
+
+def debounce_search(widget, variable, callback, delay=SEARCH_DELAY_MS):
+    """Call callback once variable has stopped changing for delay milliseconds"""
+    pending = {}
+
+    def on_write(*args):
+        if pending.get('id'):
+            widget.after_cancel(pending['id'])
+        pending['id'] = widget.after(delay, fire)
+
+    def fire():
+        pending['id'] = None
+        callback()
+
+    variable.trace_add("write", on_write)
+
+
+class ColumnStore:
+    """Columnar row storage for VirtualTable.
+
+    Each column is kept as one sequence (a list, or a NumPy array for frames),
+    so a million rows cost a handful of arrays instead of a million row objects.
+    Indexing returns the row as a tuple of values.
+    """
+
+    def __init__(self, columns, data=None):
+        self.columns = list(columns)
+        self.data = {col: (data[col] if data is not None else []) for col in self.columns}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Wrap a DataFrame without building per-row Python objects"""
+        columns = [str(col) for col in df.columns]
+        return cls(columns, {name: df.iloc[:, i].to_numpy() for i, name in enumerate(columns)})
+
+    def __len__(self):
+        return len(self.data[self.columns[0]]) if self.columns else 0
+
+    def __getitem__(self, index):
+        return tuple(self.data[col][index] for col in self.columns)
+
+    def append(self, values):
+        for col, value in zip(self.columns, values):
+            self.data[col].append(value)
+
+    def extend(self, rows):
+        for values in rows:
+            self.append(values)
+
+    def column(self, name):
+        return self.data[name]
+
+    def set_value(self, index, column, value):
+        self.data[column][index] = value
+
+
+class VirtualTable(ttk.Frame):
+    """Treeview-based table that only materializes the rows currently on screen.
+
+    The table keeps one Treeview item per visible line and refills those items
+    from the backing source when it is scrolled, resized or refreshed, so the
+    cost of showing a preview does not grow with the number of rows.
+
+    source is any sequence (a ColumnStore, a list of dicts, ...). row_fn turns
+    one element into the tuple of cell values and tag_fn into a Treeview tag;
+    by default elements are used as the values themselves. set_view() restricts
+    the table to a list of source indices, e.g. search results.
+    """
+
+    def __init__(self, parent, columns=(), headings=None, widths=None, anchors=None,
+                 row_fn=None, tag_fn=None, horizontal_scroll=False, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.source = []
+        self.view = None
+        self.row_fn = row_fn
+        self.tag_fn = tag_fn
+        self.offset = 0
+        self.row_height = DEFAULT_ROW_HEIGHT
+        self.header_height = DEFAULT_ROW_HEIGHT
+        self._slots = []
+        self._refresh_pending = False
+
+        self.tree = ttk.Treeview(self, show='headings', selectmode='browse')
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        if horizontal_scroll:
+            hsb = ttk.Scrollbar(self, orient='horizontal', command=self.tree.xview)
+            self.tree.configure(xscrollcommand=hsb.set)
+            hsb.grid(row=1, column=0, sticky='ew')
+
+        self.set_columns(columns, headings, widths, anchors)
+
+        self.tree.bind('<Configure>', lambda e: self.refresh())
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll_rows(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_rows(3))
+        self.tree.bind('<Prior>', lambda e: self.scroll_rows(-self._visible_capacity()))
+        self.tree.bind('<Next>', lambda e: self.scroll_rows(self._visible_capacity()))
+        self.tree.bind('<Home>', lambda e: self.scroll_to(0))
+        self.tree.bind('<End>', lambda e: self.scroll_to(len(self)))
+
+    def set_columns(self, columns, headings=None, widths=None, anchors=None, default_width=120):
+        """(Re)define the columns; headings, widths and anchors are optional dicts keyed by column"""
+        headings, widths, anchors = headings or {}, widths or {}, anchors or {}
+        self.columns = list(columns)
+        self.tree['columns'] = self.columns
+        for col in self.columns:
+            self.tree.heading(col, text=headings.get(col, col))
+            self.tree.column(col, width=widths.get(col, default_width), minwidth=60, anchor=anchors.get(col, 'w'))
+
+    def heading(self, column, **kwargs):
+        return self.tree.heading(column, **kwargs)
+
+    def column(self, column, **kwargs):
+        return self.tree.column(column, **kwargs)
+
+    def tag_configure(self, tag, **kwargs):
+        return self.tree.tag_configure(tag, **kwargs)
+
+    def set_source(self, source, row_fn=None, tag_fn=None):
+        """Show a new backing source from the top"""
+        self.source = source
+        if row_fn is not None:
+            self.row_fn = row_fn
+        if tag_fn is not None:
+            self.tag_fn = tag_fn
+        self.view = None
+        self.offset = 0
+        self.refresh()
+
+    def set_view(self, indices=None):
+        """Limit the table to these source indices (None shows every row)"""
+        self.view = indices
+        self.offset = 0
+        self.refresh()
+
+    def clear(self):
+        self.set_source([])
+
+    def __len__(self):
+        return len(self.view if self.view is not None else self.source)
+
+    def refresh(self):
+        """Redraw the visible window; repeated calls before the next idle are coalesced"""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.after_idle(self._render)
+
+    def scroll_to(self, index):
+        self.offset = index
+        self._render()
+
+    def scroll_rows(self, delta):
+        self.scroll_to(self.offset + delta)
+
+    def _visible_capacity(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return 1
+        return max(1, (height - self.header_height) // self.row_height)
+
+    def _render(self):
+        self._refresh_pending = False
+        total = len(self)
+        capacity = self._visible_capacity()
+        self.offset = max(0, min(self.offset, total - capacity))
+        count = min(capacity, total - self.offset)
+
+        while len(self._slots) < count:
+            self._slots.append(self.tree.insert('', 'end'))
+        while len(self._slots) > count:
+            self.tree.delete(self._slots.pop())
+
+        for slot, position in zip(self._slots, range(self.offset, self.offset + count)):
+            item = self.source[self.view[position] if self.view is not None else position]
+            values = self.row_fn(item) if self.row_fn else item
+            tags = (self.tag_fn(item),) if self.tag_fn else ()
+            self.tree.item(slot, values=list(values), tags=tags)
+
+        if self._slots:
+            bbox = self.tree.bbox(self._slots[0])
+            if bbox and bbox[3] > 0 and (bbox[1], bbox[3]) != (self.header_height, self.row_height):
+                self.header_height, self.row_height = bbox[1], bbox[3]
+                self.refresh()
+
+        if total:
+            self.scrollbar.set(self.offset / total, (self.offset + count) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _on_scrollbar(self, action, *args):
+        capacity = self._visible_capacity()
+        if action == 'moveto':
+            self.scroll_to(int(float(args[0]) * len(self)))
+        elif action == 'scroll':
+            amount, unit = int(args[0]), args[1]
+            self.scroll_rows(amount * capacity if unit == 'pages' else amount)
+
+    def _on_mousewheel(self, event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+        return 'break'
@@ -1,9 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import pandas as pd
 import os
+import threading
 from typing import Dict, List
-from templates.create_templates import create_worksheet_sync_template
+from engine.exporters import export_filetypes, PARQUET_COMPRESSIONS
+from engine.sheet_cache import default_cache
+from engine.workbook_session import arrow_available
+from engine.worksheet_sync import estimate_rows, list_worksheets, open_session, preview_sync, stream_sync, PREVIEW_ROWS
+from modules.virtual_table import VirtualTable, ColumnStore
 
 class WorksheetSyncModule:
     def __init__(self, parent):
@@ -11,11 +15,27 @@ class WorksheetSyncModule:
         self.parent.configure(bg='#1a1a1a')
 
         self.workbook_path = None
+        # Open only while an export runs; previews and loads open the workbook for just as long as they read it,
+        # so edits saved in Excel are seen and the file is never held open (and locked, on Windows) in between
+        self.export_session = None
+        # Parsed sheets of earlier exports; unchanged workbooks are read from it instead of parsed again
+        self.sheet_cache = default_cache()
         self.worksheets = []
-        self.sync_data = {}
+        self.selected_worksheets = []
+        self.sync_header_row = 1
+        self.sync_data = None
 
         self.setup_styles()
         self.create_widgets()
+        self.parent.bind('<Destroy>', self.on_destroy, add='+')
+
+    def on_destroy(self, event):
+        if event.widget is not self.parent:
+            return
+        # Closing the window cancels a running export: its reads fail and the partial file is removed
+        session, self.export_session = self.export_session, None
+        if session is not None:
+            session.close()
 
     def setup_styles(self):
         style = ttk.Style()
@@ -47,9 +67,11 @@ class WorksheetSyncModule:
         selection_card.grid_columnconfigure(1, weight=1)
         ttk.Label(selection_card, text="Step 1: Select Workbook", font=('Segoe UI', 14, 'bold')).grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 15))
         self.file_path_var = tk.StringVar(value="No file selected")
-        ttk.Button(selection_card, text="Browse Excel File", command=self.browse_file, width=25).grid(row=1, column=0, sticky="w", padx=(0, 10))
+        self.browse_btn = ttk.Button(selection_card, text="Browse Excel File", command=self.browse_file, width=25)
+        self.browse_btn.grid(row=1, column=0, sticky="w", padx=(0, 10))
         ttk.Label(selection_card, textvariable=self.file_path_var, style='Status.TLabel').grid(row=1, column=1, sticky="ew")
-        ttk.Button(selection_card, text="Generate Sample Workbook", command=self.generate_template, width=25).grid(row=2, column=0, sticky="w", pady=(10, 0))
+        self.sample_btn = ttk.Button(selection_card, text="Generate Sample Workbook", command=self.generate_template, width=25)
+        self.sample_btn.grid(row=2, column=0, sticky="w", pady=(10, 0))
 
         # --- Step 2: Configuration ---
         config_card = ttk.Frame(main_frame, style='Card.TFrame', padding=20)
@@ -86,17 +108,9 @@ class WorksheetSyncModule:
         main_frame.grid_rowconfigure(3, weight=1)
         ttk.Label(preview_card, text="Step 3: Preview and Sync", font=('Segoe UI', 14, 'bold')).grid(row=0, column=0, sticky="w", pady=(0, 15))
 
-        tree_frame = ttk.Frame(preview_card)
-        tree_frame.grid(row=1, column=0, sticky="nsew")
-        tree_frame.grid_rowconfigure(0, weight=1)
-        tree_frame.grid_columnconfigure(0, weight=1)
-        self.preview_tree = ttk.Treeview(tree_frame, show='headings')
-        vsb = ttk.Scrollbar(tree_frame, orient='vertical', command=self.preview_tree.yview)
-        hsb = ttk.Scrollbar(tree_frame, orient='horizontal', command=self.preview_tree.xview)
-        self.preview_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        self.preview_tree.grid(row=0, column=0, sticky='nsew')
-        vsb.grid(row=0, column=1, sticky='ns')
-        hsb.grid(row=1, column=0, sticky='ew')
+        # Only the visible rows are drawn, so large syncs preview instantly
+        self.preview_tree = VirtualTable(preview_card, horizontal_scroll=True)
+        self.preview_tree.grid(row=1, column=0, sticky="nsew")
 
         action_frame = ttk.Frame(preview_card)
         action_frame.grid(row=2, column=0, sticky="ew", pady=(15, 0))
@@ -104,6 +118,12 @@ class WorksheetSyncModule:
         self.sync_btn.pack(side='right', padx=(0, 10))
         self.export_btn = ttk.Button(action_frame, text="Export Synced Data", command=self.export_data, state='disabled')
         self.export_btn.pack(side='right')
+        self.parquet_compression = tk.StringVar(value=PARQUET_COMPRESSIONS[0])
+        if arrow_available():
+            ttk.Combobox(action_frame, textvariable=self.parquet_compression, values=PARQUET_COMPRESSIONS, state='readonly', width=8).pack(side='right', padx=(0, 10))
+            ttk.Label(action_frame, text="Parquet compression:").pack(side='right', padx=(0, 5))
+        self.progress_bar = ttk.Progressbar(action_frame, orient='horizontal', mode='determinate')
+        self.progress_bar.pack(side='left', fill='x', expand=True, padx=(0, 20))
 
         self.status_var = tk.StringVar(value="Ready")
         ttk.Label(main_frame, textvariable=self.status_var, style='Status.TLabel').grid(row=4, column=0, sticky="ew", pady=(10, 0))
@@ -118,7 +138,7 @@ class WorksheetSyncModule:
     def load_workbook(self):
         try:
             self.status_var.set(f"Loading {os.path.basename(self.workbook_path)}...")
-            self.worksheets = pd.ExcelFile(self.workbook_path).sheet_names
+            self.worksheets = list_worksheets(self.workbook_path)
             self.ws_listbox.delete(0, 'end')
             for ws in self.worksheets:
                 self.ws_listbox.insert('end', ws)
@@ -138,23 +158,18 @@ class WorksheetSyncModule:
         try:
             self.status_var.set("Syncing worksheets...")
             self.sync_data = None
-            dataframes = []
-            header_row_index = self.header_var.get() - 1
-
-            for ws_name in selected_worksheets:
-                df = pd.read_excel(self.workbook_path, sheet_name=ws_name, header=header_row_index)
-                df['Source Worksheet'] = ws_name
-                dataframes.append(df)
-
-            if dataframes:
-                merged_df = pd.concat(dataframes, ignore_index=True)
-                # Reorder columns to have 'Source Worksheet' first
-                cols = ['Source Worksheet'] + [col for col in merged_df.columns if col != 'Source Worksheet']
-                self.sync_data = merged_df[cols]
+            # Only the first rows are read here; the export streams every row straight from the workbook
+            self.sync_data = preview_sync(self.workbook_path, selected_worksheets, self.header_var.get(),
+                                          cache=self.sheet_cache)
 
             if self.sync_data is not None and not self.sync_data.empty:
+                self.selected_worksheets = selected_worksheets
+                self.sync_header_row = self.header_var.get()
                 self.update_synced_preview()
-                self.status_var.set("Worksheets synced successfully.")
+                if len(self.sync_data) < PREVIEW_ROWS:
+                    self.status_var.set(f"Worksheets synced successfully. {len(self.sync_data)} rows.")
+                else:
+                    self.status_var.set(f"Worksheets synced. Showing the first {PREVIEW_ROWS:,} rows; the export includes all rows.")
                 self.export_btn.config(state='normal')
             else:
                 self.status_var.set("No data found in selected worksheets.")
@@ -166,22 +181,17 @@ class WorksheetSyncModule:
         if self.sync_data is None:
             return
 
-        self.preview_tree.delete(*self.preview_tree.get_children())
-        
-        headers = self.sync_data.columns.tolist()
-        self.preview_tree['columns'] = headers
-        for col in headers:
-            self.preview_tree.heading(col, text=col)
-            self.preview_tree.column(col, width=120, minwidth=60)
-
-        for index, row in self.sync_data.iterrows():
-            self.preview_tree.insert('', 'end', values=row.tolist())
+        store = ColumnStore.from_frame(self.sync_data)
+        self.preview_tree.set_columns(store.columns)
+        self.preview_tree.set_source(store)
 
     def generate_template(self):
         file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], title="Save Sample Workbook")
         if not file_path:
             return
         try:
+            import pandas as pd
+            from templates.create_templates import create_worksheet_sync_template
             sheets = create_worksheet_sync_template()
             with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
                 for sheet_name, df in sheets.items():
@@ -198,14 +208,67 @@ class WorksheetSyncModule:
             messagebox.showwarning("Warning", "No synced data to export.")
             return
 
-        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], title="Save Synced Data")
+        # The format follows the chosen extension; CSV, Parquet and Feather write much faster than xlsx
+        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=export_filetypes(), title="Save Synced Data")
         if not file_path:
             return
+
         try:
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                self.sync_data.to_excel(writer, sheet_name='Synced_Data', index=False)
-            messagebox.showinfo("Success", f"Data exported successfully to {file_path}")
-            self.status_var.set("Data exported successfully.")
+            session = open_session(self.workbook_path)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to export data: {str(e)}")
-            self.status_var.set("Error exporting data.")
\ No newline at end of file
+            messagebox.showerror("Error", f"Failed to open workbook: {str(e)}")
+            return
+        # One export at a time; the thread closes its session when it finishes
+        for button in (self.export_btn, self.sync_btn, self.browse_btn, self.sample_btn):
+            button.config(state='disabled')
+        self.export_session = session
+        total_rows = estimate_rows(self.workbook_path, self.selected_worksheets, self.sync_header_row, session)
+        if total_rows:
+            self.progress_bar.config(mode='determinate', maximum=total_rows, value=0)
+        else:
+            self.progress_bar.config(mode='indeterminate')
+            self.progress_bar.start(15)
+        self.status_var.set("Exporting synced data...")
+        thread = threading.Thread(target=self._export_thread, args=(file_path, session), daemon=True)
+        thread.start()
+
+    def _export_thread(self, file_path, session):
+        def on_progress(sheet_name, rows_written):
+            self.parent.after(0, self._show_export_progress, sheet_name, rows_written)
+
+        try:
+            # Sheets that fit the memory budget are parsed in parallel worker processes, bigger ones streamed;
+            # the archive and shared strings come from the session
+            compression = self.parquet_compression.get() if file_path.lower().endswith('.parquet') else None
+            result = stream_sync(self.workbook_path, self.selected_worksheets, file_path, self.sync_header_row,
+                                 on_progress=on_progress, session=session, max_workers=None, compression=compression,
+                                 cache=self.sheet_cache)
+            error = None
+        except Exception as e:
+            result, error = None, e
+        finally:
+            if session is not None:
+                session.close()
+        try:
+            self.parent.after(0, self.finalize_export, file_path, result, error)
+        except (tk.TclError, RuntimeError):
+            pass  # The window was closed while exporting
+
+    def _show_export_progress(self, sheet_name, rows_written):
+        if str(self.progress_bar['mode']) == 'determinate':
+            self.progress_bar['value'] = min(rows_written, self.progress_bar['maximum'])
+        self.status_var.set(f"Exporting {sheet_name}... {rows_written:,} rows written")
+
+    def finalize_export(self, file_path, result, error):
+        self.export_session = None
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate', value=0)
+        for button in (self.export_btn, self.sync_btn, self.browse_btn, self.sample_btn):
+            button.config(state='normal')
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to export data: {str(error)}")
+            self.status_var.set("Error exporting data.")
+            return
+        sheets_note = f" across {result['sheets']} sheets (Excel row limit)" if result['sheets'] > 1 else ""
+        messagebox.showinfo("Success", f"{result['rows']:,} rows exported successfully to {file_path}{sheets_note}")
+        self.status_var.set("Data exported successfully.")
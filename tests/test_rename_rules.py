@@ -0,0 +1,14 @@
+import pytest
+
+from engine.rename_rules import MODE_REPLACE, RenameRule
+
+
+def test_replace_keeps_backreferences_of_the_template():
+    rule = RenameRule(r'(\d+)', MODE_REPLACE, r'<\1>')
+    assert rule.apply('a12b34.txt', 'parent') == 'a<12>b<34>.txt'
+
+
+@pytest.mark.parametrize('parent', [r'C:\Shots', r'take\1', 'back\\'])
+def test_replace_inserts_names_with_backslashes_as_they_are(parent):
+    rule = RenameRule(r'\d+', MODE_REPLACE, '{parent}')
+    assert rule.apply('a1.txt', parent) == f'a{parent}.txt'
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from engine.sheet_cache import SheetCache
+
+pa = pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    pd.DataFrame({'ID': [1, 2], 3: ['a', 'b']}).to_excel(path, sheet_name='Data', index=False)
+    return path
+
+
+def test_round_trip_keeps_headers(workbook, tmp_path):
+    cache = SheetCache(str(tmp_path / 'cache'))
+    frame = pd.DataFrame({'ID': [1, 2], 3: ['a', 'b']})
+    assert cache.store(workbook, 'Data', 1, frame)
+    assert list(cache.load(workbook, 'Data', 1).columns) == ['ID', 3]
+
+
+@pytest.mark.parametrize('entry', ['garbage', 'no_metadata'])
+def test_unreadable_entry_is_a_miss(workbook, tmp_path, entry):
+    from pyarrow import feather
+    cache = SheetCache(str(tmp_path / 'cache'))
+    (tmp_path / 'cache').mkdir()
+    path = cache.entry_path(workbook, 'Data', 1)
+    if entry == 'garbage':
+        with open(path, 'wb') as f:
+            f.write(b'not a feather file')
+    else:
+        feather.write_feather(pa.table({'ID': [1, 2]}), path)
+    assert cache.load(workbook, 'Data', 1) is None
@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+
+from engine.worksheet_sync import SCHEMA_SAMPLE_ROWS, SchemaWidened, iter_sync_chunks, preview_sync, resolve_schema, stream_sync
+
+SHEETS = ['S0', 'S1', 'S2']
+ROWS = 1500
+# Row of S1 from which its IDs are text; beyond the rows the schema is sampled from
+TEXT_FROM = 1200
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / 'late_text.xlsx'
+    with pd.ExcelWriter(path) as writer:
+        for sheet in SHEETS:
+            ids = list(range(ROWS))
+            if sheet == 'S1':
+                ids[TEXT_FROM:] = [f"X{i}" for i in range(TEXT_FROM, ROWS)]
+            pd.DataFrame({'ID': ids, 'Value': [i / 2 for i in range(ROWS)]}).to_excel(writer, sheet_name=sheet, index=False)
+    return str(path)
+
+
+def test_sample_misses_the_late_text(workbook):
+    assert TEXT_FROM > SCHEMA_SAMPLE_ROWS
+    schema = resolve_schema(workbook, SHEETS)
+    assert schema.dtypes['ID'] == 'Int64'
+    frame = pd.DataFrame({'ID': [1, 'X2']}, dtype=object)
+    with pytest.raises(SchemaWidened) as raised:
+        schema.align(frame, 'S1')
+    assert raised.value.dtypes == {'ID': 'text'}
+    # align reports the wider dtype but leaves the schema alone
+    assert schema.dtypes['ID'] == 'Int64'
+
+
+def test_every_column_of_a_chunk_is_widened_at_once(workbook):
+    schema = resolve_schema(workbook, SHEETS)
+    frame = pd.DataFrame({'ID': [1, 'X2'], 'Value': [0.5, 'n/a']}, dtype=object)
+    with pytest.raises(SchemaWidened) as raised:
+        schema.align(frame, 'S1')
+    assert raised.value.dtypes == {'ID': 'text', 'Value': 'text'}
+    schema.widen(raised.value.dtypes)
+    assert schema.align(frame, 'S1')['Value'].tolist() == ['0.5', 'n/a']
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'feather', 'csv'])
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_type_change_after_the_sample_is_exported(workbook, tmp_path, extension, max_workers):
+    if extension != 'csv':
+        pytest.importorskip('pyarrow')
+    output = str(tmp_path / f'synced.{extension}')
+    result = stream_sync(workbook, SHEETS, output, chunk_rows=500, max_workers=max_workers)
+    assert result['rows'] == ROWS * len(SHEETS)
+
+    read = {'parquet': pd.read_parquet, 'feather': pd.read_feather, 'csv': lambda path: pd.read_csv(path, dtype=str)}
+    ids = read[extension](output)['ID']
+    expected = [str(i) for i in range(ROWS)] + [str(i) for i in range(TEXT_FROM)] \
+        + [f"X{i}" for i in range(TEXT_FROM, ROWS)] + [str(i) for i in range(ROWS)]
+    assert ids.astype(str).tolist() == expected
+
+
+def test_preview_widens_too(workbook):
+    preview = preview_sync(workbook, SHEETS, max_rows=ROWS + TEXT_FROM + 10)
+    assert preview['ID'].iloc[ROWS + TEXT_FROM] == f"X{TEXT_FROM}"
+    assert preview['ID'].iloc[0] == '0'
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_cached_export_matches_uncached(workbook, tmp_path, max_workers):
+    pytest.importorskip('pyarrow')
+    from engine.sheet_cache import SheetCache
+    cache = SheetCache(str(tmp_path / 'cache'))
+    exports = {}
+    for run, run_cache in (('uncached', None), ('cold', cache), ('warm', cache)):
+        output = str(tmp_path / f'{run}.parquet')
+        stream_sync(workbook, SHEETS, output, max_workers=max_workers, cache=run_cache)
+        exports[run] = pd.read_parquet(output)
+    assert cache.size() > 0
+    pd.testing.assert_frame_equal(exports['cold'], exports['uncached'])
+    pd.testing.assert_frame_equal(exports['warm'], exports['uncached'])
+
+
+def test_row_budget_is_kept_when_the_session_is_opened_here(workbook, tmp_path):
+    pytest.importorskip('pyarrow')
+    from engine.sheet_cache import SheetCache
+    cache = SheetCache(str(tmp_path / 'cache'))
+    schema = resolve_schema(workbook, SHEETS)
+    schema.widen({'ID': 'text'})
+    chunks = list(iter_sync_chunks(workbook, SHEETS, schema=schema, cache=cache, row_budget=ROWS - 1))
+    assert sum(len(chunk) for chunk in chunks) == ROWS * len(SHEETS)
+    # Every sheet is over the budget, so all of them were streamed and none was cached
+    assert cache.size() == 0
+
+
+def test_cache_entries_follow_the_workbook_the_session_read(workbook, tmp_path):
+    pytest.importorskip('pyarrow')
+    import os
+    from engine.sheet_cache import SheetCache
+    from engine.workbook_session import WorkbookSession
+    cache = SheetCache(str(tmp_path / 'cache'))
+    with WorkbookSession(workbook) as session:
+        # Saved again while the session still reads the old file
+        pd.DataFrame({'ID': [7]}).to_excel(tmp_path / 'saved.xlsx', sheet_name='S0', index=False)
+        os.replace(tmp_path / 'saved.xlsx', workbook)
+        stream_sync(workbook, ['S0'], str(tmp_path / 'synced.csv'), session=session, cache=cache)
+        assert cache.contains(workbook, 'S0', 1, session.fingerprint)
+    assert not cache.contains(workbook, 'S0', 1)